@@ -1,14 +1,14 @@
 """
 BiliSub 管理员后台路由
-处理用户管理和邀请码管理
+处理用户管理、邀请码管理、任务时间线查询和性能采样
 """
 import secrets
 import os
 import shutil
-from flask import Blueprint, request, jsonify, render_template
+from flask import Blueprint, request, jsonify, render_template, Response
 from flask_login import login_required, current_user
 from functools import wraps
-from models import db, User, HistoryItem, SystemConfig
+from models import db, User, HistoryItem, SystemConfig, TaskTrace, invalidate_user_snapshots
 
 admin_bp = Blueprint('admin', __name__)
 
@@ -69,6 +69,7 @@ def delete_user(user_id):
     # 删除用户（级联删除历史记录）
     db.session.delete(user)
     db.session.commit()
+    invalidate_user_snapshots(user_id)
     
     return jsonify({
         'success': True,
@@ -204,3 +205,95 @@ def get_stats():
             'total_history': total_history
         }
     })
+
+
+# ============ 任务时间线 ============
+
+@admin_bp.route('/api/admin/traces', methods=['GET'])
+@admin_required
+def get_traces():
+    """
+    任务时间线列表（不含 span 数据）
+    
+    查询参数:
+        sort: slowest 按总耗时倒序，默认按时间倒序
+        kind: batch / extension
+        bvid: 按视频过滤
+        limit: 条数，最多 200
+    """
+    from sqlalchemy.orm import defer
+    
+    query = TaskTrace.query.options(defer(TaskTrace.data))
+    kind = request.args.get('kind', '').strip()
+    bvid = request.args.get('bvid', '').strip()
+    if kind:
+        query = query.filter(TaskTrace.kind == kind)
+    if bvid:
+        query = query.filter(TaskTrace.bvid == bvid)
+    if request.args.get('sort') == 'slowest':
+        query = query.order_by(TaskTrace.duration_ms.desc())
+    else:
+        query = query.order_by(TaskTrace.id.desc())
+    limit = max(1, min(request.args.get('limit', 50, type=int), 200))
+    
+    return jsonify({
+        'success': True,
+        'traces': [t.to_dict() for t in query.limit(limit).all()]
+    })
+
+
+@admin_bp.route('/api/admin/traces/<int:trace_id>', methods=['GET'])
+@admin_required
+def get_trace(trace_id):
+    """单个任务的时间线（span 树）"""
+    trace = db.session.get(TaskTrace, trace_id)
+    if not trace:
+        return jsonify({'success': False, 'error': '记录不存在'}), 404
+    
+    return jsonify({
+        'success': True,
+        'trace': dict(trace.to_dict(), timeline=trace.get_data())
+    })
+
+
+# ============ 性能采样 ============
+
+@admin_bp.route('/api/admin/profile', methods=['GET'])
+@admin_required
+def profile():
+    """
+    对运行中的进程采样 N 秒，返回调用栈火焰图数据
+    
+    查询参数:
+        seconds: 采样时长，1-60，默认 10
+        interval: 采样间隔（毫秒），1-100，默认 10
+        format: speedscope（默认，可拖入 https://www.speedscope.app）/ collapsed（flamegraph.pl 折叠栈）
+        idle: 为 1 时保留空闲等待的样本
+    """
+    import json
+    import time
+    from profiler import StackSampler
+    
+    seconds = max(1, min(request.args.get('seconds', 10, type=int), 60))
+    interval = max(1, min(request.args.get('interval', 10, type=int), 100))
+    output = request.args.get('format', 'speedscope')
+    if output not in ('speedscope', 'collapsed'):
+        return jsonify({'success': False, 'error': 'format 仅支持 speedscope / collapsed'}), 400
+    
+    if not StackSampler.acquire():
+        return jsonify({'success': False, 'error': '已有采样正在进行'}), 409
+    try:
+        sampler = StackSampler(interval=interval / 1000, include_idle=request.args.get('idle') == '1')
+        sampler.run(seconds)
+    finally:
+        StackSampler.release()
+    
+    stamp = time.strftime('%Y%m%d-%H%M%S')
+    if output == 'collapsed':
+        return Response(sampler.to_collapsed(), mimetype='text/plain', headers={
+            'Content-Disposition': f'attachment; filename=bilisub-profile-{stamp}.folded'
+        })
+    body = json.dumps(sampler.to_speedscope(name=f'BiliSub {stamp} ({seconds}s)'), separators=(',', ':'))
+    return Response(body, mimetype='application/json', headers={
+        'Content-Disposition': f'attachment; filename=bilisub-profile-{stamp}.speedscope.json'
+    })
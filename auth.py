@@ -3,9 +3,10 @@ BiliSub 认证路由
 处理登录、注册、登出和密码修改
 """
 import logging
-from flask import Blueprint, request, jsonify, redirect, url_for, render_template, session
+from flask import Blueprint, request, jsonify, redirect, url_for, render_template, session, current_app
 from flask_login import login_user, logout_user, login_required, current_user
-from models import db, User, SystemConfig, HistoryItem
+from models import (db, User, SystemConfig, HistoryItem, HistoryContent, history_search, invalidate_user_snapshots,
+                    history_bvid, commit_history_item)
 import json
 
 logger = logging.getLogger(__name__)
@@ -189,24 +190,25 @@ def save_user_config():
         return jsonify({'success': True, 'message': '配置已保存（会话级）'})
     
     # 普通用户：保存到数据库
+    user = current_user.load()
     if 'api_key' in data:
-        current_user.api_key = data['api_key']
+        user.api_key = data['api_key']
         logger.info(f"[save-config] 更新 api_key, 长度: {len(data['api_key'])}")
     if 'bili_cookie' in data:
-        current_user.bili_cookie = data['bili_cookie']
+        user.bili_cookie = data['bili_cookie']
         logger.info(f"[save-config] 更新 bili_cookie, 长度: {len(data['bili_cookie'])}")
     if 'llm_api_key' in data:
-        current_user.llm_api_key = data['llm_api_key']
+        user.llm_api_key = data['llm_api_key']
     if 'llm_api_url' in data:
-        current_user.llm_api_url = data['llm_api_url']
+        user.llm_api_url = data['llm_api_url']
     if 'llm_model' in data:
-        current_user.llm_model = data['llm_model']
+        user.llm_model = data['llm_model']
     if 'llm_prompt' in data:
-        current_user.llm_prompt = data['llm_prompt']
+        user.llm_prompt = data['llm_prompt']
     if 'use_self_hosted' in data:
-        current_user.use_self_hosted = data['use_self_hosted']
+        user.use_self_hosted = data['use_self_hosted']
     if 'self_hosted_domain' in data:
-        current_user.self_hosted_domain = data['self_hosted_domain']
+        user.self_hosted_domain = data['self_hosted_domain']
     
     db.session.commit()
     logger.info(f"[save-config] 配置已保存到数据库")
@@ -267,27 +269,177 @@ def _save_guest_history(history_list):
     session['guest_history'] = history_list
     session.modified = True
 
+# 历史列表分页大小
+HISTORY_PAGE_SIZE = 50
+HISTORY_MAX_PAGE_SIZE = 500
+
+
+def _encode_history_cursor(item) -> str:
+    """分页游标：最后一条记录的 (created_at, id)"""
+    import base64
+    raw = f"{item.created_at.isoformat() if item.created_at else ''}|{item.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def _decode_history_cursor(cursor: str):
+    import base64
+    from datetime import datetime
+    created_at, item_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+    return datetime.fromisoformat(created_at), int(item_id)
+
+
 @auth_bp.route('/api/history', methods=['GET'])
 @login_required
 def get_history():
-    """获取用户历史记录"""
+    """
+    获取用户历史记录（按创建时间倒序，游标分页）
+    
+    参数:
+        limit: 每页条数，默认 50
+        cursor: 上一页返回的 next_cursor
+        fields: 逗号分隔的返回字段（id 和 created_at 始终返回）
+    
+    响应:
+        {"success": true, "history": [...], "next_cursor": "下一页游标，没有更多时为 null", "total": 总数}
+        支持 ETag / If-None-Match，数据未变化时返回 304
+    """
     try:
         # Guest 用户：从 session 获取
         if getattr(current_user, 'is_guest', False):
             history = _get_guest_history()
             logger.info(f"[history] Guest 从 session 获取历史记录，共 {len(history)} 条")
-            return jsonify({'success': True, 'history': history})
+            return jsonify({'success': True, 'history': history, 'next_cursor': None, 'total': len(history)})
+        
+        limit = min(max(request.args.get('limit', HISTORY_PAGE_SIZE, type=int), 1), HISTORY_MAX_PAGE_SIZE)
+        cursor = request.args.get('cursor', '').strip()
+        fields = request.args.get('fields', '').strip()
+        if fields:
+            fields = [f.strip() for f in fields.split(',') if f.strip()]
+            unknown = set(fields) - set(HistoryItem.SUMMARY_FIELDS)
+            if unknown:
+                return jsonify({'success': False, 'error': f"不支持的字段: {', '.join(sorted(unknown))}"}), 400
+            fields = [f for f in HistoryItem.SUMMARY_FIELDS if f in fields or f in ('id', 'created_at')]
+        else:
+            fields = list(HistoryItem.SUMMARY_FIELDS)
         
-        # 普通用户：从数据库获取
-        items = HistoryItem.query.filter_by(user_id=current_user.id)\
-            .order_by(HistoryItem.created_at.desc())\
-            .limit(500)\
+        # 条数和最后修改时间变化即说明列表有增删改，据此生成 ETag
+        from sqlalchemy import func
+        total, last_modified = db.session.query(func.count(HistoryItem.id), func.max(HistoryItem.updated_at))\
+            .filter(HistoryItem.user_id == current_user.id).one()
+        import hashlib
+        etag = hashlib.md5(
+            f"{current_user.id}|{total}|{last_modified}|{limit}|{cursor}|{','.join(fields)}".encode()
+        ).hexdigest()
+        if etag in request.if_none_match:
+            response = current_app.response_class(status=304)
+            response.set_etag(etag)
+            return response
+        
+        from sqlalchemy.orm import load_only
+        query = HistoryItem.query.filter_by(user_id=current_user.id)\
+            .options(load_only(*[getattr(HistoryItem, f) for f in fields]))
+        if cursor:
+            try:
+                cursor_created_at, cursor_id = _decode_history_cursor(cursor)
+            except Exception:
+                return jsonify({'success': False, 'error': '无效的分页游标'}), 400
+            query = query.filter(db.or_(
+                HistoryItem.created_at < cursor_created_at,
+                db.and_(HistoryItem.created_at == cursor_created_at, HistoryItem.id < cursor_id)
+            ))
+        items = query.order_by(HistoryItem.created_at.desc(), HistoryItem.id.desc())\
+            .limit(limit + 1)\
             .all()
         
-        return jsonify({
+        has_more = len(items) > limit
+        items = items[:limit]
+        response = jsonify({
             'success': True,
-            'history': [item.to_dict() for item in items]
+            'history': [item.to_summary_dict(fields) for item in items],
+            'next_cursor': _encode_history_cursor(items[-1]) if has_more else None,
+            'total': total
         })
+        response.set_etag(etag)
+        # 允许浏览器缓存，但每次使用前需向服务器确认
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+    except Exception as e:
+        logger.error(f"[history] 获取历史记录失败: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@auth_bp.route('/api/history/search', methods=['GET'])
+@login_required
+def search_history():
+    """
+    全文搜索历史记录（标题、UP主、标签、AI 总结、字幕），按相关度排序
+    
+    参数:
+        q: 搜索词，多个词以空格分隔（同时包含）
+        limit: 返回条数，默认 20
+        offset: 偏移量
+    
+    响应:
+        {"success": true, "results": [{...列表字段, "snippet": "含 <mark> 高亮的片段"}]}
+    """
+    query = request.args.get('q', '').strip()
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    if not query:
+        return jsonify({'success': True, 'results': []})
+    
+    try:
+        # Guest 用户：在 session 中查找
+        if getattr(current_user, 'is_guest', False):
+            keyword = query.lower()
+            results = [
+                dict(h, snippet='') for h in _get_guest_history()
+                if any(keyword in (h.get(k) or '').lower() for k in ('title', 'owner', 'transcript'))
+            ]
+            return jsonify({'success': True, 'results': results[offset:offset + limit]})
+        
+        if history_search.enabled:
+            hits = history_search.search(current_user.id, query, limit=limit, offset=offset)
+        else:
+            # 未启用全文索引（如非 SQLite 数据库），只按标题和UP主匹配
+            pattern = f"%{query}%"
+            rows = HistoryItem.query.with_entities(HistoryItem.id).filter(
+                HistoryItem.user_id == current_user.id,
+                db.or_(HistoryItem.title.ilike(pattern), HistoryItem.owner.ilike(pattern))
+            ).order_by(HistoryItem.created_at.desc()).offset(offset).limit(limit).all()
+            hits = [(row.id, '') for row in rows]
+        
+        items = {item.id: item for item in HistoryItem.query.filter(
+            HistoryItem.user_id == current_user.id,
+            HistoryItem.id.in_([history_id for history_id, _ in hits])
+        )}
+        results = [
+            dict(items[history_id].to_summary_dict(), snippet=snippet)
+            for history_id, snippet in hits if history_id in items
+        ]
+        return jsonify({'success': True, 'results': results})
+    except Exception as e:
+        logger.error(f"[history] 搜索历史记录失败: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@auth_bp.route('/api/history/<int:item_id>', methods=['GET'])
+@login_required
+def get_history_item(item_id):
+    """获取单条历史记录（包含字幕和 AI 结果）"""
+    try:
+        # Guest 用户：从 session 获取
+        if getattr(current_user, 'is_guest', False):
+            item = next((h for h in _get_guest_history() if h.get('id') == item_id), None)
+            if not item:
+                return jsonify({'success': False, 'error': '记录不存在'}), 404
+            return jsonify({'success': True, 'item': item})
+        
+        item = HistoryItem.query.filter_by(id=item_id, user_id=current_user.id).first()
+        if not item:
+            return jsonify({'success': False, 'error': '记录不存在'}), 404
+        
+        return jsonify({'success': True, 'item': item.to_dict()})
     except Exception as e:
         logger.error(f"[history] 获取历史记录失败: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -346,19 +498,27 @@ def save_history():
             return jsonify({'success': True, 'item': item_data})
         
         # 普通用户：保存到数据库
+        # 同一视频只保留一条记录：先按 URL 查找，再按 BV 号查找（短链、不同参数的链接）
+        bvid = history_bvid(url, data.get('bvid', ''))
         existing = HistoryItem.query.filter_by(user_id=current_user.id, url=url).first()
+        if not existing and bvid:
+            existing = HistoryItem.query.filter_by(user_id=current_user.id, bvid=bvid).first()
+        
+        def apply(target):
+            target.title = data.get('title', target.title)
+            target.owner = data.get('owner', target.owner)
+            target.cover = data.get('cover', target.cover)
+            target.bvid = bvid or target.bvid
+            target.duration = data.get('duration', target.duration)
+            target.pubdate = data.get('pubdate', target.pubdate)
+            target.tags = json.dumps(data.get('tags', [])) if data.get('tags') else target.tags
+            target.transcript = data.get('transcript', target.transcript)
+            target.ai_result = data.get('ai_result', target.ai_result)
         
         if existing:
-            existing.title = data.get('title', existing.title)
-            existing.owner = data.get('owner', existing.owner)
-            existing.cover = data.get('cover', existing.cover)
-            existing.bvid = data.get('bvid', existing.bvid)
-            existing.duration = data.get('duration', existing.duration)
-            existing.pubdate = data.get('pubdate', existing.pubdate)
-            existing.tags = json.dumps(data.get('tags', [])) if data.get('tags') else existing.tags
-            existing.transcript = data.get('transcript', existing.transcript)
-            existing.ai_result = data.get('ai_result', existing.ai_result)
+            apply(existing)
             item = existing
+            db.session.commit()
         else:
             item = HistoryItem(
                 user_id=current_user.id,
@@ -366,7 +526,7 @@ def save_history():
                 title=data.get('title', ''),
                 owner=data.get('owner', ''),
                 cover=data.get('cover', ''),
-                bvid=data.get('bvid', ''),
+                bvid=bvid,
                 duration=data.get('duration'),
                 pubdate=data.get('pubdate'),
                 tags=json.dumps(data.get('tags', [])) if data.get('tags') else None,
@@ -374,8 +534,8 @@ def save_history():
                 ai_result=data.get('ai_result', '')
             )
             db.session.add(item)
-        
-        db.session.commit()
+            # 并发保存同一视频时改为更新先插入的记录
+            item = commit_history_item(item, apply)
         
         return jsonify({
             'success': True,
@@ -415,6 +575,16 @@ def delete_history(item_id):
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+def _delete_history_items(query) -> int:
+    """批量删除历史记录及其字幕内容，返回删除条数"""
+    ids = query.with_entities(HistoryItem.id).subquery()
+    HistoryContent.query.filter(HistoryContent.history_id.in_(db.select(ids.c.id)))\
+        .delete(synchronize_session=False)
+    if history_search.enabled:
+        history_search.remove(db.session.connection(), db.select(ids.c.id))
+    return query.delete(synchronize_session=False)
+
+
 @auth_bp.route('/api/history/clear', methods=['DELETE'])
 @login_required
 def clear_history():
@@ -426,8 +596,8 @@ def clear_history():
             logger.info(f"[history] Guest 历史记录已清空")
             return jsonify({'success': True, 'message': '历史记录已清空'})
         
-        # 普通用户：清空数据库
-        HistoryItem.query.filter_by(user_id=current_user.id).delete()
+        # 普通用户：清空数据库（批量删除不经过 ORM 级联，需同时删除字幕内容）
+        _delete_history_items(HistoryItem.query.filter_by(user_id=current_user.id))
         db.session.commit()
         
         return jsonify({'success': True, 'message': '历史记录已清空'})
@@ -459,7 +629,7 @@ def delete_history_by_url():
             return jsonify({'success': True, 'deleted': deleted})
         
         # 普通用户：从数据库删除
-        deleted = HistoryItem.query.filter_by(user_id=current_user.id, url=url).delete()
+        deleted = _delete_history_items(HistoryItem.query.filter_by(user_id=current_user.id, url=url))
         db.session.commit()
         
         return jsonify({'success': True, 'deleted': deleted})
@@ -485,9 +655,12 @@ def generate_extension_token():
     try:
         # 生成 64 字符的安全令牌
         new_token = secrets.token_urlsafe(48)[:64]
-        current_user.extension_token = new_token
-        current_user.extension_last_sync = None  # 重置同步时间
+        user = current_user.load()
+        user.extension_token = new_token
+        user.extension_last_sync = None  # 重置同步时间
         db.session.commit()
+        # 旧令牌立即失效
+        invalidate_user_snapshots(current_user.id)
         
         logger.info(f"[extension] 用户 {current_user.username} 生成了新的插件令牌")
         
@@ -536,9 +709,11 @@ def unbind_extension():
         return jsonify({'success': False, 'error': 'Guest 账户不支持插件功能'}), 403
     
     try:
-        current_user.extension_token = None
-        current_user.extension_last_sync = None
+        user = current_user.load()
+        user.extension_token = None
+        user.extension_last_sync = None
         db.session.commit()
+        invalidate_user_snapshots(current_user.id)
         
         logger.info(f"[extension] 用户 {current_user.username} 解绑了插件")
         
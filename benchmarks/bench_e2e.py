@@ -0,0 +1,368 @@
+"""
+端到端处理流水线基准
+在本地模拟服务（benchmarks/mock_services.py）上运行 app，不访问任何外部网络：
+    batch:     网页端批量转录（/api/transcribe_batch，轮询 /api/batch_status）
+    extension: 插件批量任务（/api/extension/tasks/batch，轮询 /api/extension/task/<id>）
+    llm:       并发调用 /api/llm_process
+输出吞吐量、端到端与各阶段（task_traces 中的 span）p50/p99 耗时、CPU / 内存 / 线程 / 线程池队列峰值，
+以及模拟服务收到的请求数和注入的错误数。
+没有 CC 字幕的视频走 yt-dlp + DashScope 语音识别，需要安装 yt-dlp 和 dashscope。
+
+用法:
+    python benchmarks/bench_e2e.py [--workload batch,extension,llm] [--videos 20] [--subtitle-ratio 0.5]
+        [--latency bilibili=80,dashscope=150] [--jitter 20] [--errors bilibili=0.02,storage=0.1]
+        [--asr-queue-ms 500] [--asr-speed 20] [--cdn-kbps 0] [--unthrottled] [--json report.json]
+"""
+import argparse
+import json
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from mock_services import SERVICES, MockConfig, MockServices, install_redirect  # noqa: E402
+
+BILI_COOKIE = 'SESSDATA=bench-sessdata; bili_jct=bench-jct; buvid3=bench-buvid3; DedeUserID=1000'
+API_KEY = 'sk-bench'
+
+
+def parse_pairs(text: str, cast=float) -> dict:
+    """解析 svc=value,svc=value，svc 为 all 时作用于所有服务"""
+    result = {}
+    for item in filter(None, (text or '').split(',')):
+        name, _, value = item.partition('=')
+        name = name.strip()
+        names = SERVICES if name == 'all' else (name,)
+        for service in names:
+            if service not in SERVICES:
+                raise SystemExit(f'未知服务: {service}（可选 {", ".join(SERVICES)}, all）')
+            result[service] = cast(value)
+    return result
+
+
+def percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def summarize(values: list) -> dict:
+    return {
+        'count': len(values),
+        'p50': round(percentile(values, 50), 1),
+        'p99': round(percentile(values, 99), 1),
+        'max': round(max(values), 1) if values else 0.0,
+    }
+
+
+class ResourceMonitor:
+    """后台采样进程资源：CPU 时间、RSS 峰值、线程数峰值和各线程池队列深度峰值"""
+
+    def __init__(self, app_module, interval: float = 0.2):
+        self.app = app_module
+        self.interval = interval
+        self.peak_threads = 0
+        self.peak_queue = {}
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, name='bench-monitor', daemon=True)
+
+    def start(self):
+        self.started = time.perf_counter()
+        self.cpu_start = resource.getrusage(resource.RUSAGE_SELF)
+        self.thread.start()
+        return self
+
+    def _sample(self):
+        self.peak_threads = max(self.peak_threads, threading.active_count())
+        for name, pool in self.app._EXECUTORS.items():
+            self.peak_queue[name] = max(self.peak_queue.get(name, 0), pool._work_queue.qsize())
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            self._sample()
+
+    def stop(self) -> dict:
+        self._sample()
+        self.stop_event.set()
+        self.thread.join()
+        wall = time.perf_counter() - self.started
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        user = usage.ru_utime - self.cpu_start.ru_utime
+        system = usage.ru_stime - self.cpu_start.ru_stime
+        # Linux 上 ru_maxrss 单位为 KB，macOS 为字节
+        peak_rss = usage.ru_maxrss / 1024 if sys.platform != 'darwin' else usage.ru_maxrss / 1024 / 1024
+        return {
+            'wall_seconds': round(wall, 2),
+            'cpu_user_seconds': round(user, 2),
+            'cpu_system_seconds': round(system, 2),
+            'cpu_percent': round((user + system) / wall * 100, 1) if wall else 0.0,
+            'peak_rss_mb': round(peak_rss, 1),
+            'peak_threads': self.peak_threads,
+            'peak_executor_queue': self.peak_queue,
+        }
+
+
+class Harness:
+    def __init__(self, args, mock: MockServices):
+        self.args = args
+        self.mock = mock
+        import app
+        self.app = app
+        self.client = app.app.test_client()
+        self.extension_token = None
+
+    def setup(self):
+        if self.args.unthrottled:
+            # 去掉 B站限流，测量流水线自身的上限
+            limiter = self.app.BiliRateLimiter
+            self.app.bili_rate_limiter = limiter(rates={family: (1000.0, 1000) for family in limiter.DEFAULT_RATES})
+        resp = self.client.post('/api/login', json={'username': self.args.username, 'password': self.args.password})
+        if resp.status_code != 200:
+            raise SystemExit(f'登录失败: {resp.status_code} {resp.get_data(as_text=True)[:200]}')
+        self.client.post('/api/save-config', json={'api_key': API_KEY, 'bili_cookie': BILI_COOKIE})
+        if 'extension' in self.args.workload:
+            resp = self.client.post('/api/user/extension/generate-token')
+            self.extension_token = resp.get_json()['token']
+
+    def _wait(self, poll, timeout: float):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if poll():
+                return True
+            time.sleep(self.args.poll_interval)
+        return False
+
+    def run_batch(self, bvids: list) -> dict:
+        videos = [{'url': f'https://www.bilibili.com/video/{bvid}', 'title': bvid, 'index': i}
+                  for i, bvid in enumerate(bvids)]
+        started = time.perf_counter()
+        resp = self.client.post('/api/transcribe_batch', json={
+            'videos': videos, 'api_key': API_KEY, 'bili_cookie': BILI_COOKIE,
+            'cookie_valid': True, 'api_valid': True, 'use_self_hosted': False,
+        })
+        data = resp.get_json() or {}
+        batch_id = data.get('batch_id')
+        if not batch_id:
+            raise SystemExit(f'创建批量任务失败: {resp.status_code} {data}')
+        state = {}
+
+        def poll():
+            body = self.client.get(f'/api/batch_status/{batch_id}?results=0').get_json()
+            state['data'] = body.get('data') or {}
+            return state['data'].get('status') != 'processing'
+
+        finished = self._wait(poll, self.args.timeout)
+        statuses = [v.get('status') for v in state.get('data', {}).get('videos', [])]
+        return self._workload_result(time.perf_counter() - started, len(bvids), finished,
+                                     statuses.count('completed'), statuses.count('error'))
+
+    def run_extension(self, bvids: list) -> dict:
+        headers = {'X-Extension-Token': self.extension_token}
+        started = time.perf_counter()
+        resp = self.client.post('/api/extension/tasks/batch', headers=headers, json={
+            'videos': [{'bvid': bvid, 'title': bvid} for bvid in bvids], 'use_asr': True,
+            'collection_title': 'bench',
+        })
+        task_ids = (resp.get_json() or {}).get('task_ids') or []
+        pending = set(task_ids)
+        statuses = {}
+
+        def poll():
+            for task_id in list(pending):
+                task = self.client.get(f'/api/extension/task/{task_id}', headers=headers).get_json().get('task') or {}
+                if task.get('status') in ('completed', 'failed', 'cancelled'):
+                    statuses[task_id] = task['status']
+                    pending.discard(task_id)
+            return not pending
+
+        finished = self._wait(poll, self.args.timeout)
+        values = list(statuses.values())
+        return self._workload_result(time.perf_counter() - started, len(task_ids), finished,
+                                     values.count('completed'), values.count('failed'))
+
+    def run_llm(self) -> dict:
+        from concurrent.futures import ThreadPoolExecutor
+
+        content = '\n'.join(f'字幕第 {i + 1} 行内容' for i in range(self.args.llm_lines))
+        payload = {'api_key': API_KEY, 'api_url': 'https://api.openai.com/v1/chat/completions',
+                   'model': 'gpt-4o-mini', 'prompt': '请总结以下内容', 'content': content}
+        latencies, errors = [], 0
+        lock = threading.Lock()
+
+        def call(_):
+            nonlocal errors
+            client = self.app.app.test_client()
+            with client.session_transaction() as sess:
+                sess.update(self._session)
+            start = time.perf_counter()
+            resp = client.post('/api/llm_process', json=payload)
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                latencies.append(elapsed)
+                if resp.status_code != 200 or not (resp.get_json() or {}).get('success'):
+                    errors += 1
+
+        with self.client.session_transaction() as sess:
+            self._session = dict(sess)
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.args.llm_concurrency) as pool:
+            list(pool.map(call, range(self.args.llm_requests)))
+        wall = time.perf_counter() - started
+        return {
+            'requests': self.args.llm_requests,
+            'errors': errors,
+            'wall_seconds': round(wall, 2),
+            'requests_per_second': round(self.args.llm_requests / wall, 2) if wall else 0.0,
+            'latency_ms': summarize(latencies),
+        }
+
+    @staticmethod
+    def _workload_result(wall: float, total: int, finished: bool, completed: int, failed: int) -> dict:
+        return {
+            'videos': total,
+            'completed': completed,
+            'failed': failed,
+            'timed_out': not finished,
+            'wall_seconds': round(wall, 2),
+            'videos_per_minute': round(completed / wall * 60, 2) if wall else 0.0,
+        }
+
+    def collect_traces(self, kinds: list) -> dict:
+        """读取 task_traces，统计端到端和各 span 耗时"""
+        from models import TaskTrace, db_writer
+
+        # 写入队列按顺序执行，空操作返回时之前提交的时间线均已落库
+        db_writer.run(lambda: None, timeout=30)
+        end_to_end, stages = {}, {}
+        with self.app.app.app_context():
+            for row in TaskTrace.query.filter(TaskTrace.kind.in_(kinds)).all():
+                end_to_end.setdefault(row.kind, []).append(row.duration_ms)
+                for span in row.get_data().get('spans', []):
+                    stages.setdefault(span[0], []).append(span[3])
+        return {
+            'end_to_end_ms': {kind: summarize(values) for kind, values in sorted(end_to_end.items())},
+            'stage_ms': {name: summarize(values) for name, values in sorted(stages.items())},
+        }
+
+
+def print_report(report: dict):
+    for name, result in report['workloads'].items():
+        if name == 'llm':
+            lat = result['latency_ms']
+            print(f"[llm] {result['requests']} 次请求, 失败 {result['errors']}, "
+                  f"{result['requests_per_second']} 次/秒, p50 {lat['p50']}ms, p99 {lat['p99']}ms")
+            continue
+        timeout = '（超时）' if result['timed_out'] else ''
+        print(f"[{name}] {result['completed']}/{result['videos']} 完成, 失败 {result['failed']}, "
+              f"耗时 {result['wall_seconds']}s, {result['videos_per_minute']} 个/分钟{timeout}")
+    traces = report.get('traces') or {}
+    for kind, stats in traces.get('end_to_end_ms', {}).items():
+        print(f"端到端 [{kind}]: p50 {stats['p50']}ms, p99 {stats['p99']}ms, max {stats['max']}ms")
+    if traces.get('stage_ms'):
+        print(f"\n{'阶段':<16}{'次数':>8}{'p50(ms)':>12}{'p99(ms)':>12}{'max(ms)':>12}")
+        for name, stats in traces['stage_ms'].items():
+            print(f"{name:<16}{stats['count']:>8}{stats['p50']:>12}{stats['p99']:>12}{stats['max']:>12}")
+    res = report['resources']
+    print(f"\nCPU: 用户 {res['cpu_user_seconds']}s + 系统 {res['cpu_system_seconds']}s "
+          f"({res['cpu_percent']}%), RSS 峰值 {res['peak_rss_mb']}MB, 线程峰值 {res['peak_threads']}, "
+          f"线程池队列峰值 {res['peak_executor_queue']}")
+    print('\n模拟服务:')
+    for service, stats in report['mock'].items():
+        print(f"  {service:<10} 请求 {stats['requests']:>6}, 错误 {stats['errors']:>4}, "
+              f"上行 {stats['bytes_in'] / 1024:.0f}KB, 下行 {stats['bytes_out'] / 1024:.0f}KB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workload', default='batch,extension', help='batch / extension / llm，逗号分隔')
+    parser.add_argument('--videos', type=int, default=20, help='每个视频工作负载的视频数')
+    parser.add_argument('--subtitle-ratio', type=float, default=0.5, help='带 CC 字幕的视频比例')
+    parser.add_argument('--duration', type=int, default=180, help='视频时长（秒）')
+    parser.add_argument('--audio-kbps', type=int, default=64, help='音频码率，决定下载和上传的数据量')
+    parser.add_argument('--cdn-kbps', type=float, default=0, help='音频 CDN 限速（0 为不限速）')
+    parser.add_argument('--upload-kbps', type=float, default=0, help='临时存储上传限速（0 为不限速）')
+    parser.add_argument('--subtitle-lines', type=int, default=60)
+    parser.add_argument('--asr-queue-ms', type=float, default=500, help='语音识别排队时间')
+    parser.add_argument('--asr-speed', type=float, default=20, help='语音识别速度（音频秒数 / 实际秒数）')
+    parser.add_argument('--latency', default='', help='各服务的响应延迟（毫秒），如 bilibili=80,all=20')
+    parser.add_argument('--jitter', default='', help='各服务的延迟抖动（毫秒），如 all=10')
+    parser.add_argument('--errors', default='', help='各服务的错误率，如 bilibili=0.02,storage=0.1')
+    parser.add_argument('--llm-requests', type=int, default=50)
+    parser.add_argument('--llm-concurrency', type=int, default=8)
+    parser.add_argument('--llm-lines', type=int, default=200, help='LLM 请求携带的字幕行数')
+    parser.add_argument('--unthrottled', action='store_true', help='去掉 B站接口限流')
+    parser.add_argument('--timeout', type=float, default=600, help='每个工作负载的最长等待时间（秒）')
+    parser.add_argument('--poll-interval', type=float, default=0.2)
+    parser.add_argument('--username', default='admin')
+    parser.add_argument('--password', default='admin')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help='同时将报告写入 JSON 文件')
+    args = parser.parse_args()
+    args.workload = [w.strip() for w in args.workload.split(',') if w.strip()]
+    unknown = set(args.workload) - {'batch', 'extension', 'llm'}
+    if unknown:
+        raise SystemExit(f'未知工作负载: {", ".join(sorted(unknown))}')
+
+    config = MockConfig(video_duration=args.duration, audio_kbps=args.audio_kbps,
+                        subtitle_ratio=args.subtitle_ratio, subtitle_lines=args.subtitle_lines,
+                        asr_queue_ms=args.asr_queue_ms, asr_speed=args.asr_speed, cdn_kbps=args.cdn_kbps,
+                        upload_kbps=args.upload_kbps, seed=args.seed)
+    for service, value in parse_pairs(args.latency).items():
+        config.profiles[service].latency_ms = value
+    for service, value in parse_pairs(args.jitter).items():
+        config.profiles[service].jitter_ms = value
+    for service, value in parse_pairs(args.errors).items():
+        config.profiles[service].error_rate = value
+
+    mock = MockServices(config).start()
+    install_redirect(mock.base_url)
+    for name in ('HTTP_PROXY', 'HTTPS_PROXY', 'ALL_PROXY', 'http_proxy', 'https_proxy', 'all_proxy'):
+        os.environ.pop(name, None)
+
+    # 独立的临时数据库，必须在 import app 之前设置
+    workdir = tempfile.mkdtemp(prefix='bilisub-bench-')
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(workdir, "bench.db")}'
+    os.environ.setdefault('SECRET_KEY', 'bench')
+
+    harness = Harness(args, mock)
+    harness.setup()
+    monitor = ResourceMonitor(harness.app).start()
+    workloads = {}
+    try:
+        # 两个视频工作负载使用不同的 BV 号，避免插件任务命中批量任务写入的历史记录
+        bvids = mock.register_videos(args.videos * 2)
+        batch_bvids = bvids[0::2]
+        extension_bvids = bvids[1::2]
+        if 'batch' in args.workload:
+            workloads['batch'] = harness.run_batch(batch_bvids)
+        if 'extension' in args.workload:
+            workloads['extension'] = harness.run_extension(extension_bvids)
+        if 'llm' in args.workload:
+            workloads['llm'] = harness.run_llm()
+    finally:
+        resources = monitor.stop()
+    kinds = [w for w in args.workload if w != 'llm']
+    report = {
+        'args': {k: v for k, v in vars(args).items() if k not in ('password', 'json')},
+        'workloads': workloads,
+        'traces': harness.collect_traces(kinds) if kinds else {},
+        'resources': resources,
+        'mock': mock.stats.to_dict(),
+    }
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    mock.stop()
+
+
+if __name__ == '__main__':
+    main()
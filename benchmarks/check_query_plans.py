@@ -0,0 +1,88 @@
+"""
+热路径查询计划检查
+在临时 SQLite 数据库上对插件和历史列表的热点查询执行 EXPLAIN QUERY PLAN，
+确认每条查询都命中预期的组合索引、没有全表扫描或临时排序；
+任一查询不符合预期时以非零状态退出，可用于 CI 或修改模型/查询后的回归检查
+
+用法:
+    python benchmarks/check_query_plans.py
+"""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask  # noqa: E402
+
+from models import db, HistoryItem, ExtensionTask  # noqa: E402
+
+TERMINAL_STATUSES = ['completed', 'failed', 'cancelled']
+
+
+def hot_queries():
+    """(名称, 查询, 预期索引)"""
+    return [
+        ('插件按 BV 号查历史',
+         HistoryItem.query.filter_by(user_id=1, bvid='BV1xx411c7mD'),
+         'uq_history_items_user_bvid'),
+        ('批量查已有字幕的历史',
+         HistoryItem.query.with_entities(HistoryItem.bvid).filter(
+             HistoryItem.user_id == 1, HistoryItem.bvid.in_(['BV1', 'BV2', 'BV3']),
+             HistoryItem.has_transcript.is_(True)),
+         'uq_history_items_user_bvid'),
+        ('按 URL 保存/删除历史',
+         HistoryItem.query.filter_by(user_id=1, url='https://www.bilibili.com/video/BV1xx411c7mD'),
+         'ix_history_items_user_url'),
+        ('历史列表分页',
+         HistoryItem.query.filter_by(user_id=1).order_by(HistoryItem.created_at.desc(), HistoryItem.id.desc()).limit(50),
+         'ix_history_items_user_created'),
+        ('查找视频未完成的插件任务',
+         ExtensionTask.query.filter_by(user_id=1, bvid='BV1xx411c7mD').filter(
+             ExtensionTask.status.notin_(TERMINAL_STATUSES)).order_by(ExtensionTask.created_at.desc()).limit(1),
+         'ix_extension_tasks_user_bvid_created'),
+        ('用户插件任务列表',
+         ExtensionTask.query.filter_by(user_id=1).order_by(ExtensionTask.created_at.desc()).limit(20),
+         'ix_extension_tasks_user_created'),
+    ]
+
+
+def explain(query) -> list:
+    compiled = query.statement.compile(db.engine, compile_kwargs={'literal_binds': True})
+    rows = db.session.execute(db.text(f"EXPLAIN QUERY PLAN {compiled}")).all()
+    return [row[-1] for row in rows]
+
+
+def main():
+    workdir = tempfile.mkdtemp(prefix='bilisub_plan_')
+    check_app = Flask(__name__)
+    check_app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(workdir, 'plan.db')}"
+    db.init_app(check_app)
+    
+    failures = 0
+    with check_app.app_context():
+        db.create_all()
+        for name, query, expected_index in hot_queries():
+            plan = explain(query)
+            detail = ' | '.join(plan)
+            problems = []
+            if not any(expected_index in step for step in plan):
+                problems.append(f'未使用索引 {expected_index}')
+            if any(step.startswith('SCAN') and 'INDEX' not in step for step in plan):
+                problems.append('存在全表扫描')
+            if any('TEMP B-TREE' in step for step in plan):
+                problems.append('存在临时排序')
+            status = 'OK  ' if not problems else 'FAIL'
+            print(f"[{status}] {name}: {detail}")
+            for problem in problems:
+                print(f"       {problem}")
+            failures += bool(problems)
+    
+    if failures:
+        print(f"\n{failures} 条查询的执行计划不符合预期")
+        sys.exit(1)
+    print("\n所有热路径查询均命中预期索引")
+
+
+if __name__ == '__main__':
+    main()
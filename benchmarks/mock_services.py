@@ -0,0 +1,504 @@
+"""
+端到端基准使用的本地模拟服务
+一个多线程 HTTP 服务按原始域名分发请求，模拟：
+    bilibili   api.bilibili.com（view / nav / spi / player v2 / pagelist / playurl）和视频页
+    subtitle   字幕 CDN（*.hdslb.com）
+    cdn        音频 CDN（*.bilivideo.com）
+    storage    第三方临时存储（tmpfile.link / litterbox / file.io / 0x0.st / transfer.sh）
+    dashscope  DashScope 录音文件识别（提交、轮询、结果 JSON）
+    llm        OpenAI 兼容的 chat/completions
+每个服务可单独配置延迟、抖动和错误率。
+
+install_redirect() 改写 requests 和 yt-dlp 的出站请求：
+https://<host>/<path> -> http://127.0.0.1:<port>/<host>/<path>，响应的 url 仍为原地址
+"""
+import hashlib
+import json
+import random
+import threading
+import time
+import urllib.parse
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SERVICES = ('bilibili', 'subtitle', 'cdn', 'storage', 'dashscope', 'llm')
+
+STORAGE_HOSTS = {'tmpfile.link', 'litterbox.catbox.moe', 'file.io', '0x0.st', 'transfer.sh'}
+LLM_HOSTS = {'api.openai.com', 'api.deepseek.com', 'llm.mock'}
+CDN_HOST = 'upos-sz-mirrorcos.bilivideo.com'
+SUBTITLE_HOST = 'aisubtitle.hdslb.com'
+ASR_RESULT_HOST = 'dashscope-result-bj.oss-cn-beijing.aliyuncs.com'
+
+WBI_IMG = 'https://i0.hdslb.com/bfs/wbi/7cd084941338484aae1ad9425b84077c.png'
+WBI_SUB = 'https://i0.hdslb.com/bfs/wbi/4932caff0ff746eab6f01bf08b70ac45.png'
+
+
+def classify(host: str, path: str = '') -> str:
+    """按域名归类到服务"""
+    if host in ('api.bilibili.com', 'www.bilibili.com', 'm.bilibili.com'):
+        return 'bilibili'
+    if host.endswith('hdslb.com'):
+        return 'subtitle'
+    if 'bilivideo' in host or host.endswith('akamaized.net'):
+        return 'cdn'
+    if host in STORAGE_HOSTS:
+        return 'storage'
+    if host in LLM_HOSTS or (host == 'dashscope.aliyuncs.com' and '/compatible-mode/' in path):
+        return 'llm'
+    if host == 'dashscope.aliyuncs.com' or host == ASR_RESULT_HOST:
+        return 'dashscope'
+    return 'unknown'
+
+
+class ServiceProfile:
+    """单个服务的延迟（毫秒）、抖动（毫秒）和错误率"""
+
+    def __init__(self, latency_ms: float = 0, jitter_ms: float = 0, error_rate: float = 0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+
+    def delay(self, rng: random.Random) -> float:
+        jitter = rng.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0
+        return max(0.0, self.latency_ms + jitter) / 1000
+
+
+class MockConfig:
+    """
+    模拟数据参数
+    视频按 BV 号确定性生成：前 subtitle_ratio 比例的视频带 CC 字幕，其余需要语音识别
+    """
+
+    def __init__(self, video_duration: int = 180, audio_kbps: int = 64, subtitle_ratio: float = 0.5,
+                 subtitle_lines: int = 60, asr_queue_ms: float = 500, asr_speed: float = 20,
+                 cdn_kbps: float = 0, upload_kbps: float = 0, llm_tokens: int = 300, seed: int = 1):
+        self.video_duration = video_duration
+        self.audio_kbps = audio_kbps
+        self.subtitle_ratio = subtitle_ratio
+        self.subtitle_lines = subtitle_lines
+        self.asr_queue_ms = asr_queue_ms
+        self.asr_speed = asr_speed  # 识别速度（音频秒数 / 实际秒数）
+        self.cdn_kbps = cdn_kbps  # 0 为不限速
+        self.upload_kbps = upload_kbps
+        self.llm_tokens = llm_tokens
+        self.seed = seed
+        self.profiles = {name: ServiceProfile() for name in SERVICES}
+
+    @property
+    def audio_bytes(self) -> int:
+        return int(self.video_duration * self.audio_kbps * 1000 / 8)
+
+
+def make_bvid(index: int) -> str:
+    """第 index 个测试视频的 BV 号（BV + 10 位）"""
+    return 'BV1' + hashlib.md5(f'bench-{index}'.encode()).hexdigest()[:9]
+
+
+class MockStats:
+    """按服务统计请求数、错误数和字节数"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = {}
+        self.errors = {}
+        self.bytes_in = {}
+        self.bytes_out = {}
+
+    def add(self, service: str, error: bool = False, bytes_in: int = 0, bytes_out: int = 0):
+        with self.lock:
+            self.requests[service] = self.requests.get(service, 0) + 1
+            if error:
+                self.errors[service] = self.errors.get(service, 0) + 1
+            self.bytes_in[service] = self.bytes_in.get(service, 0) + bytes_in
+            self.bytes_out[service] = self.bytes_out.get(service, 0) + bytes_out
+
+    def to_dict(self) -> dict:
+        with self.lock:
+            return {
+                service: {
+                    'requests': self.requests.get(service, 0),
+                    'errors': self.errors.get(service, 0),
+                    'bytes_in': self.bytes_in.get(service, 0),
+                    'bytes_out': self.bytes_out.get(service, 0),
+                }
+                for service in sorted(self.requests)
+            }
+
+
+class MockServices:
+    """本地模拟服务，start() 后通过 base_url 访问"""
+
+    def __init__(self, config: MockConfig = None):
+        self.config = config or MockConfig()
+        self.stats = MockStats()
+        self.rng = random.Random(self.config.seed)
+        self.rng_lock = threading.Lock()
+        self.asr_tasks = {}  # task_id -> {'created', 'duration', 'file_url'}
+        self.asr_lock = threading.Lock()
+        self.bvid_index = {}
+        self.server = None
+        self.thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        services = self
+
+        class Handler(_MockHandler):
+            mock = services
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, name='mock-services', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+    # ---------- 数据 ----------
+
+    def register_videos(self, count: int) -> list:
+        """生成 count 个测试视频的 BV 号"""
+        bvids = [make_bvid(i) for i in range(count)]
+        self.bvid_index = {bvid: i for i, bvid in enumerate(bvids)}
+        return bvids
+
+    def _index(self, bvid: str) -> int:
+        return self.bvid_index.get(bvid, 0)
+
+    def has_subtitle(self, bvid: str) -> bool:
+        count = max(len(self.bvid_index), 1)
+        return self._index(bvid) < round(count * self.config.subtitle_ratio)
+
+    def cid(self, bvid: str) -> int:
+        return 30000000000 + self._index(bvid)
+
+    def aid(self, bvid: str) -> int:
+        return 110000000000000 + self._index(bvid)
+
+    def video_data(self, bvid: str) -> dict:
+        cid = self.cid(bvid)
+        duration = self.config.video_duration
+        return {
+            'bvid': bvid, 'aid': self.aid(bvid), 'cid': cid, 'videos': 1,
+            'title': f'基准测试视频 {self._index(bvid)}', 'desc': '', 'duration': duration,
+            'pic': f'https://i0.hdslb.com/bfs/archive/{bvid}.jpg', 'pubdate': 1700000000,
+            'owner': {'mid': 1000, 'name': '基准UP主', 'face': ''},
+            'pages': [{'cid': cid, 'page': 1, 'part': 'P1', 'duration': duration}],
+            'stat': {'view': 1000, 'like': 10},
+            'rights': {'is_stein_gate': 0},
+        }
+
+    def play_info(self, bvid: str) -> dict:
+        duration = self.config.video_duration
+        return {
+            'timelength': duration * 1000,
+            'accept_quality': [16],
+            'dash': {
+                'duration': duration,
+                'audio': [{
+                    'id': 30280,
+                    'baseUrl': f'https://{CDN_HOST}/upgcxcode/{bvid}/audio-30280.m4s',
+                    'backupUrl': [],
+                    'bandwidth': self.config.audio_kbps * 1000,
+                    'mimeType': 'audio/mp4',
+                    'codecs': 'mp4a.40.2',
+                    'size': self.config.audio_bytes,
+                }],
+                'video': [],
+            },
+        }
+
+    # ---------- 语音识别任务 ----------
+
+    def asr_submit(self, body: dict) -> dict:
+        task_id = str(uuid.uuid4())
+        file_urls = (body.get('input') or {}).get('file_urls') or []
+        with self.asr_lock:
+            self.asr_tasks[task_id] = {
+                'created': time.time(),
+                'duration': self.config.video_duration,
+                'file_url': file_urls[0] if file_urls else '',
+            }
+        return {'request_id': str(uuid.uuid4()), 'output': {'task_id': task_id, 'task_status': 'PENDING'}}
+
+    def asr_fetch(self, task_id: str) -> dict:
+        with self.asr_lock:
+            task = self.asr_tasks.get(task_id)
+        if task is None:
+            return {'request_id': str(uuid.uuid4()), 'code': 'InvalidParameter', 'message': 'task not found'}
+        elapsed = time.time() - task['created']
+        queue = self.config.asr_queue_ms / 1000
+        run = task['duration'] / max(self.config.asr_speed, 0.001)
+        output = {'task_id': task_id}
+        if elapsed < queue:
+            output['task_status'] = 'PENDING'
+        elif elapsed < queue + run:
+            output['task_status'] = 'RUNNING'
+        else:
+            output['task_status'] = 'SUCCEEDED'
+            output['results'] = [{
+                'file_url': task['file_url'],
+                'transcription_url': f'https://{ASR_RESULT_HOST}/prod/paraformer-v2/{task_id}.json',
+                'subtask_status': 'SUCCEEDED',
+            }]
+        response = {'request_id': str(uuid.uuid4()), 'output': output}
+        if output['task_status'] == 'SUCCEEDED':
+            response['usage'] = {'duration': task['duration']}
+        return response
+
+    def transcript(self) -> dict:
+        sentences = [{'begin_time': i * 3000, 'end_time': i * 3000 + 2800, 'text': f'这是第 {i + 1} 句识别结果。'}
+                     for i in range(max(1, self.config.video_duration // 3))]
+        return {'transcripts': [{'channel_id': 0, 'sentences': sentences}]}
+
+    def subtitle_body(self) -> dict:
+        return {'body': [{'from': i * 2.0, 'to': i * 2.0 + 1.8, 'content': f'字幕第 {i + 1} 行内容'}
+                         for i in range(self.config.subtitle_lines)]}
+
+    def should_fail(self, service: str) -> bool:
+        rate = self.config.profiles[service].error_rate
+        if not rate:
+            return False
+        with self.rng_lock:
+            return self.rng.random() < rate
+
+    def delay(self, service: str) -> float:
+        with self.rng_lock:
+            return self.config.profiles[service].delay(self.rng)
+
+
+class _MockHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    mock: MockServices = None
+
+    def log_message(self, format, *args):
+        pass
+
+    # ---------- 通用 ----------
+
+    def _route(self):
+        """路径形如 /<原始域名>/<原始路径>"""
+        parts = urllib.parse.urlsplit(self.path)
+        segments = parts.path.split('/', 2)
+        host = segments[1] if len(segments) > 1 else ''
+        path = '/' + (segments[2] if len(segments) > 2 else '')
+        return host, path, dict(urllib.parse.parse_qsl(parts.query))
+
+    def _read_body(self, service: str) -> bytes:
+        length = int(self.headers.get('Content-Length') or 0)
+        if not length:
+            return b''
+        kbps = self.mock.config.upload_kbps if service == 'storage' else 0
+        chunks, remaining = [], length
+        while remaining > 0:
+            chunk = self.rfile.read(min(65536, remaining))
+            if not chunk:
+                break
+            chunks.append(chunk)
+            remaining -= len(chunk)
+            if kbps:
+                time.sleep(len(chunk) / (kbps * 1000 / 8))
+        return b''.join(chunks)
+
+    def _send(self, status: int, body, content_type: str = 'application/json', service: str = 'unknown',
+              bytes_in: int = 0, headers: dict = None):
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body, ensure_ascii=False).encode()
+        elif isinstance(body, str):
+            body = body.encode()
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+        self.mock.stats.add(service, error=status >= 400, bytes_in=bytes_in, bytes_out=len(body))
+
+    def _handle(self):
+        host, path, query = self._route()
+        service = classify(host, path)
+        body = self._read_body(service) if self.command in ('POST', 'PUT') else b''
+        if service == 'unknown':
+            return self._send(404, {'error': f'no mock for {host}'}, service=service, bytes_in=len(body))
+        time.sleep(self.mock.delay(service))
+        if self.mock.should_fail(service):
+            # B站以 412 模拟风控，其余服务返回 500
+            status = 412 if service == 'bilibili' else 500
+            return self._send(status, {'code': -412 if status == 412 else 500, 'message': 'injected error'},
+                              service=service, bytes_in=len(body))
+        handler = getattr(self, f'_handle_{service}')
+        return handler(host, path, query, body)
+
+    do_GET = do_POST = do_PUT = do_HEAD = lambda self: self._handle()
+
+    # ---------- 各服务 ----------
+
+    def _handle_bilibili(self, host, path, query, body):
+        mock = self.mock
+        ok = lambda data: self._send(200, {'code': 0, 'message': '0', 'data': data}, service='bilibili')  # noqa: E731
+        if host == 'www.bilibili.com':
+            # yt-dlp 解析的视频页：内嵌 __playinfo__ 和 __INITIAL_STATE__
+            bvid = path.rstrip('/').split('/')[-1]
+            play_info = json.dumps({'code': 0, 'message': '0', 'data': mock.play_info(bvid)}, ensure_ascii=False)
+            state = json.dumps({'videoData': mock.video_data(bvid), 'error': {}}, ensure_ascii=False)
+            html = (f'<!DOCTYPE html><html><head><title>{bvid}</title></head><body>'
+                    f'<script>window.__playinfo__={play_info}</script>'
+                    f'<script>window.__INITIAL_STATE__={state};(function(){{}}());</script></body></html>')
+            return self._send(200, html, content_type='text/html; charset=utf-8', service='bilibili')
+        bvid = query.get('bvid', '')
+        if path == '/x/web-interface/nav':
+            return ok({'isLogin': True, 'uname': 'bench', 'wbi_img': {'img_url': WBI_IMG, 'sub_url': WBI_SUB}})
+        if path == '/x/frontend/finger/spi':
+            return ok({'b_3': f'{uuid.uuid4()}infoc', 'b_4': f'{uuid.uuid4()}infoc'})
+        if path == '/x/web-interface/view':
+            return ok(mock.video_data(bvid))
+        if path == '/x/player/pagelist':
+            return ok(mock.video_data(bvid)['pages'])
+        if path in ('/x/player/v2', '/x/player/wbi/v2'):
+            subtitles = []
+            if mock.has_subtitle(bvid):
+                subtitles.append({
+                    'id': mock.cid(bvid), 'lan': 'ai-zh', 'lan_doc': '中文（自动生成）',
+                    'subtitle_url': f'//{SUBTITLE_HOST}/bfs/ai_subtitle/prod/{mock.aid(bvid)}{mock.cid(bvid)}.json',
+                })
+            return ok({'bvid': bvid, 'cid': mock.cid(bvid), 'subtitle': {'subtitles': subtitles}})
+        if path in ('/x/player/playurl', '/x/player/wbi/playurl'):
+            return ok(mock.play_info(bvid))
+        return ok({})
+
+    def _handle_subtitle(self, host, path, query, body):
+        return self._send(200, self.mock.subtitle_body(), service='subtitle')
+
+    def _handle_cdn(self, host, path, query, body):
+        total = self.mock.config.audio_bytes
+        start, end = 0, total - 1
+        status = 200
+        headers = {'Accept-Ranges': 'bytes'}
+        range_header = self.headers.get('Range', '')
+        if range_header.startswith('bytes='):
+            first, _, last = range_header[6:].partition('-')
+            start = int(first or 0)
+            end = min(int(last), total - 1) if last else total - 1
+            status = 206
+            headers['Content-Range'] = f'bytes {start}-{end}/{total}'
+        length = max(0, end - start + 1)
+        self.send_response(status)
+        self.send_header('Content-Type', 'audio/mp4')
+        self.send_header('Content-Length', str(length))
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.end_headers()
+        if self.command != 'HEAD':
+            kbps = self.mock.config.cdn_kbps
+            chunk = b'\0' * 65536
+            remaining = length
+            while remaining > 0:
+                size = min(len(chunk), remaining)
+                self.wfile.write(chunk[:size])
+                remaining -= size
+                if kbps:
+                    time.sleep(size / (kbps * 1000 / 8))
+        self.mock.stats.add('cdn', bytes_out=length if self.command != 'HEAD' else 0)
+
+    def _handle_storage(self, host, path, query, body):
+        if self.command in ('HEAD', 'GET'):
+            return self._send(200, b'', content_type='application/octet-stream', service='storage')
+        link = f'https://{host}/{uuid.uuid4().hex[:8]}.m4a'
+        if host == 'tmpfile.link':
+            payload = {'downloadLink': link}
+        elif host == 'file.io':
+            payload = {'success': True, 'link': link}
+        else:
+            payload = link
+        content_type = 'application/json' if isinstance(payload, dict) else 'text/plain'
+        return self._send(200, payload, content_type=content_type, service='storage', bytes_in=len(body))
+
+    def _handle_dashscope(self, host, path, query, body):
+        if host == ASR_RESULT_HOST:
+            return self._send(200, self.mock.transcript(), service='dashscope')
+        if path.endswith('/services/audio/asr/transcription') and self.command == 'POST':
+            return self._send(200, self.mock.asr_submit(json.loads(body or b'{}')), service='dashscope',
+                              bytes_in=len(body))
+        if '/tasks/' in path:
+            return self._send(200, self.mock.asr_fetch(path.rstrip('/').split('/')[-1]), service='dashscope')
+        return self._send(404, {'code': 'NotFound', 'message': path}, service='dashscope')
+
+    def _handle_llm(self, host, path, query, body):
+        if not path.endswith('/chat/completions'):
+            return self._send(404, {'error': {'message': 'not found'}}, service='llm')
+        request = json.loads(body or b'{}')
+        content = '总结：' + '要点。' * max(1, self.mock.config.llm_tokens // 3)
+        return self._send(200, {
+            'id': f'chatcmpl-{uuid.uuid4().hex[:12]}',
+            'object': 'chat.completion',
+            'model': request.get('model', 'mock'),
+            'choices': [{'index': 0, 'finish_reason': 'stop',
+                         'message': {'role': 'assistant', 'content': content}}],
+            'usage': {'prompt_tokens': len(json.dumps(request.get('messages', []))) // 2,
+                      'completion_tokens': self.mock.config.llm_tokens},
+        }, service='llm', bytes_in=len(body))
+
+
+def install_redirect(base_url: str):
+    """
+    将 requests 和 yt-dlp 的外部请求改写到模拟服务
+    localhost 请求保持不变；响应对象的 url 还原为原始地址（yt-dlp 会校验最终 URL）
+    """
+    import requests.adapters
+
+    local_hosts = {'127.0.0.1', 'localhost', '::1'}
+
+    def rewrite(url: str):
+        parts = urllib.parse.urlsplit(url)
+        if not parts.hostname or parts.hostname in local_hosts:
+            return None
+        rewritten = f'{base_url}/{parts.hostname}{parts.path or "/"}'
+        return rewritten + (f'?{parts.query}' if parts.query else '')
+
+    original_send = requests.adapters.HTTPAdapter.send
+
+    def send(self, request, **kwargs):
+        original_url = request.url
+        rewritten = rewrite(original_url)
+        if rewritten:
+            request.url = rewritten
+            kwargs['proxies'] = {}
+        response = original_send(self, request, **kwargs)
+        if rewritten:
+            response.url = original_url
+            request.url = original_url
+        return response
+
+    requests.adapters.HTTPAdapter.send = send
+
+    try:
+        import yt_dlp
+        from yt_dlp.networking import Request
+    except ImportError:
+        return
+
+    original_urlopen = yt_dlp.YoutubeDL.urlopen
+
+    def urlopen(self, req):
+        if isinstance(req, str):
+            req = Request(req)
+        original_url = req.url
+        rewritten = rewrite(original_url)
+        if rewritten:
+            req.url = rewritten
+            req.proxies = {'all': None}
+        response = original_urlopen(self, req)
+        if rewritten:
+            response.url = original_url
+        return response
+
+    yt_dlp.YoutubeDL.urlopen = urlopen
@@ -0,0 +1,134 @@
+"""
+BiliSub 消息总线
+任务进度等事件通过发布/订阅在进程间传递，待处理的任务通过队列（push/pop）分发给 worker：
+- 未配置 MESSAGE_BUS_URL 时使用进程内总线（单进程部署、测试）
+- 配置 redis://... 时使用 Redis（或兼容 Redis 协议的服务，如 Valkey、KeyDB），
+  任务进程和多个 Web 进程可以分开部署，事件会送达连接在任意 Web 进程上的浏览器
+"""
+import json
+import logging
+import queue
+import threading
+import time
+
+try:
+    import redis
+except ImportError:  # 只使用进程内总线时不需要
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+
+class InProcessBus:
+    """进程内总线：publish 时在调用线程中同步执行所有订阅者"""
+
+    def __init__(self):
+        self.handlers = {}  # channel -> [handler, ...]
+        self.queues = {}  # name -> queue.Queue
+        self.lock = threading.Lock()
+
+    def subscribe(self, channel: str, handler):
+        """订阅频道，handler(message: dict)"""
+        with self.lock:
+            self.handlers.setdefault(channel, []).append(handler)
+
+    def publish(self, channel: str, message: dict):
+        """发布消息（message 需可 JSON 序列化，与 Redis 总线保持一致）"""
+        with self.lock:
+            handlers = list(self.handlers.get(channel, []))
+        for handler in handlers:
+            try:
+                handler(message)
+            except Exception as e:
+                logger.error(f"[MessageBus] 处理消息失败: channel={channel}, {e}")
+
+    def push(self, name: str, message: dict):
+        """任务入队"""
+        self._queue(name).put(message)
+
+    def pop(self, name: str, timeout: float = 5):
+        """取出一个任务，超时返回 None"""
+        try:
+            return self._queue(name).get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def _queue(self, name: str) -> queue.Queue:
+        with self.lock:
+            return self.queues.setdefault(name, queue.Queue())
+
+    def close(self):
+        with self.lock:
+            self.handlers.clear()
+
+
+class RedisBus:
+    """
+    Redis 发布/订阅总线（任务队列使用 LPUSH/BRPOP）
+    每个进程一个后台线程监听已订阅的频道，断线后自动重连
+    """
+    RECONNECT_DELAY = 2
+
+    def __init__(self, url: str):
+        if redis is None:
+            raise RuntimeError('使用 Redis 消息总线需要安装 redis 包: pip install redis')
+        self.url = url
+        self.client = redis.Redis.from_url(url)
+        self.handlers = {}
+        self.lock = threading.Lock()
+        self.listener = None
+        self.pubsub = None
+
+    def subscribe(self, channel: str, handler):
+        with self.lock:
+            first = channel not in self.handlers
+            self.handlers.setdefault(channel, []).append(handler)
+            if self.listener is None:
+                self.listener = threading.Thread(target=self._listen, daemon=True)
+                self.listener.start()
+            elif first and self.pubsub is not None:
+                self.pubsub.subscribe(channel)
+
+    def publish(self, channel: str, message: dict):
+        self.client.publish(channel, json.dumps(message, ensure_ascii=False))
+
+    def push(self, name: str, message: dict):
+        self.client.lpush(name, json.dumps(message, ensure_ascii=False))
+
+    def pop(self, name: str, timeout: float = 5):
+        item = self.client.brpop(name, timeout=max(1, int(timeout)))
+        return json.loads(item[1]) if item else None
+
+    def _listen(self):
+        while True:
+            try:
+                with self.lock:
+                    self.pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                    self.pubsub.subscribe(*self.handlers.keys())
+                for item in self.pubsub.listen():
+                    channel = item['channel'].decode() if isinstance(item['channel'], bytes) else item['channel']
+                    with self.lock:
+                        handlers = list(self.handlers.get(channel, []))
+                    message = json.loads(item['data'])
+                    for handler in handlers:
+                        try:
+                            handler(message)
+                        except Exception as e:
+                            logger.error(f"[MessageBus] 处理消息失败: channel={channel}, {e}")
+            except Exception as e:
+                logger.warning(f"[MessageBus] Redis 订阅断开，{self.RECONNECT_DELAY} 秒后重连: {e}")
+                time.sleep(self.RECONNECT_DELAY)
+
+    def close(self):
+        if self.pubsub is not None:
+            self.pubsub.close()
+        self.client.close()
+
+
+def create_message_bus(url: str = None):
+    """根据 URL 创建消息总线：空或 memory:// 为进程内总线，redis:// / rediss:// 为 Redis"""
+    if not url or url.startswith('memory://'):
+        return InProcessBus()
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisBus(url)
+    raise ValueError(f'不支持的 MESSAGE_BUS_URL: {url}')
@@ -0,0 +1,258 @@
+"""
+BiliSub 运行指标
+进程内的 Counter / Gauge / Histogram，以 Prometheus 文本格式在 /metrics 导出（不依赖 prometheus_client）
+独立的 worker 进程用 start_http_server() 导出自己的指标
+"""
+import bisect
+import functools
+import hmac
+import threading
+import time
+from contextlib import contextmanager
+
+# 处理阶段耗时的分桶（秒）：从接口调用到长视频语音识别
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra: dict = None) -> str:
+    pairs = [f'{k}="{_escape(v)}"' for k, v in zip(names, values)]
+    if extra:
+        pairs += [f'{k}="{_escape(v)}"' for k, v in extra.items()]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    TYPE = ''
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(name, '') for name in self.labelnames)
+
+    def render(self) -> list:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.TYPE}']
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self) -> list:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """只增计数器"""
+    TYPE = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self.values = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        with self.lock:
+            return self.values.get(self._key(labels), 0)
+
+    def _samples(self):
+        with self.lock:
+            items = list(self.values.items())
+        return [f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}' for key, value in items]
+
+
+class Gauge(_Metric):
+    """
+    瞬时值
+    传入 collect 时在导出时调用 collect() 读取当前值，返回 {标签值元组: 数值}
+    """
+    TYPE = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), collect=None):
+        super().__init__(name, documentation, labelnames)
+        self.values = {}
+        self.collect = collect
+
+    def set(self, value: float, **labels):
+        with self.lock:
+            self.values[self._key(labels)] = value
+
+    def _samples(self):
+        if self.collect is not None:
+            try:
+                items = list(self.collect().items())
+            except Exception:
+                items = []
+        else:
+            with self.lock:
+                items = list(self.values.items())
+        return [f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}' for key, value in items]
+
+
+class Histogram(_Metric):
+    """分桶直方图，time() 可用作上下文管理器或装饰器"""
+    TYPE = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self.values = {}  # key -> [各桶计数, sum, count]
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = [[0] * len(self.buckets), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def timed(self, **labels):
+        """装饰器版本的 time()"""
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.time(**labels):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def _samples(self):
+        lines = []
+        with self.lock:
+            items = [(key, (list(state[0]), state[1], state[2])) for key, state in self.values.items()]
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, {'le': _format_value(bound)})
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+            lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.lock = threading.Lock()
+
+    def register(self, metric):
+        with self.lock:
+            self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        with self.lock:
+            metrics = list(self.metrics)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+# 处理流水线各阶段耗时：subtitle_fetch / ytdlp_extract / download / upload / asr_submit / asr_wait / db_save
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    'bilisub_stage_duration_seconds', '处理流水线各阶段耗时（秒）', ['stage', 'result']))
+# 第三方临时存储每个服务的上传耗时
+UPLOAD_SECONDS = REGISTRY.register(Histogram(
+    'bilisub_upload_duration_seconds', '按存储服务统计的上传耗时（秒）', ['host', 'result']))
+ASR_AUDIO_SECONDS = REGISTRY.register(Counter(
+    'bilisub_asr_audio_seconds_total', '提交语音识别成功的音频时长（计费秒数）'))
+CACHE_REQUESTS = REGISTRY.register(Counter(
+    'bilisub_cache_requests_total', '缓存查询次数（result=hit/miss）', ['cache', 'result']))
+
+
+@contextmanager
+def stage_timer(stage: str):
+    """记录一个处理阶段的耗时，异常时 result=error"""
+    start = time.perf_counter()
+    result = 'ok'
+    try:
+        yield
+    except BaseException:
+        result = 'error'
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage, result=result)
+
+
+def timed_stage(stage: str):
+    """装饰器版本的 stage_timer()"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage_timer(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_cache(cache: str, hit: bool):
+    CACHE_REQUESTS.inc(cache=cache, result='hit' if hit else 'miss')
+
+
+def start_http_server(port: int, host: str = '0.0.0.0', token: str = '', registry: Registry = REGISTRY):
+    """
+    在后台线程中以 HTTP 导出指标（供没有 Web 服务的 worker 进程使用）
+
+    Args:
+        port: 监听端口
+        host: 监听地址
+        token: 设置后请求需携带 Authorization: Bearer <token>
+        registry: 导出的指标注册表
+
+    Returns:
+        ThreadingHTTPServer: 已启动的服务，调用 shutdown() 停止
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?', 1)[0] != '/metrics':
+                self.send_error(404)
+                return
+            if token and not hmac.compare_digest(self.headers.get('Authorization', ''), f'Bearer {token}'):
+                self.send_error(401)
+                return
+            body = registry.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+    return server
@@ -2,13 +2,122 @@
 BiliSub 数据模型
 使用 Flask-SQLAlchemy 进行 ORM 映射
 """
+import queue
+import threading
+import time
+import zlib
+from concurrent.futures import Future
 from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.orm import Session
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
+from metrics import STAGE_SECONDS, record_cache
+
+try:
+    import zstandard
+except ImportError:  # requirements.txt 已列出；缺失时新数据改用 zlib 写入，但无法读取已有的 zstd 数据
+    zstandard = None
 
 db = SQLAlchemy()
 
+# SQLite 连接参数：WAL 允许读写并发，synchronous=NORMAL 在 WAL 下仍保证崩溃一致性
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 30000,  # 毫秒，写锁被占用时等待而不是立即报 database is locked
+    'cache_size': -65536,  # 负数单位为 KiB，即 64MB 页缓存
+    'mmap_size': 268435456,  # 256MB 内存映射读取
+    'temp_store': 'MEMORY',
+}
+
+
+def configure_sqlite_engine(engine, pragmas: dict = None):
+    """在每个新建的 SQLite 连接上设置 PRAGMA（非 SQLite 引擎不做处理）"""
+    if engine.dialect.name != 'sqlite':
+        return
+    pragmas = SQLITE_PRAGMAS if pragmas is None else pragmas
+    
+    @event.listens_for(engine, 'connect')
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for key, value in pragmas.items():
+            cursor.execute(f"PRAGMA {key}={value}")
+        cursor.close()
+
+
+class DBWriter:
+    """
+    数据库单写线程
+    高频写操作提交到队列，由一个线程串行执行，同时到达的写操作合并到一次提交中，
+    避免多个线程争抢 SQLite 写锁
+    """
+    
+    MAX_BATCH = 64  # 单次提交最多合并的写操作数
+    
+    def __init__(self):
+        self.app = None
+        self.queue = queue.Queue()
+        self.thread = None
+        self.lock = threading.Lock()
+    
+    def init_app(self, app):
+        self.app = app
+    
+    def submit(self, fn) -> Future:
+        """提交写操作 fn()（在应用上下文中执行，无需自行 commit），返回 Future"""
+        future = Future()
+        try:
+            with self.lock:
+                if self.thread is None or not self.thread.is_alive():
+                    self.thread = threading.Thread(target=self._loop, daemon=True)
+                    self.thread.start()
+        except RuntimeError:
+            # 解释器退出阶段无法再创建线程，直接在当前线程执行
+            with self.app.app_context():
+                self._execute([(fn, future)])
+            return future
+        self.queue.put((fn, future))
+        return future
+    
+    def run(self, fn, timeout: float = 30):
+        """提交写操作并等待其提交完成"""
+        return self.submit(fn).result(timeout=timeout)
+    
+    def _loop(self):
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < self.MAX_BATCH:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            with self.app.app_context():
+                self._execute(batch)
+    
+    def _execute(self, batch: list):
+        start = time.perf_counter()
+        try:
+            results = [fn() for fn, _ in batch]
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            STAGE_SECONDS.observe(time.perf_counter() - start, stage='db_save', result='error')
+            if len(batch) == 1:
+                batch[0][1].set_exception(e)
+                return
+            # 合并提交失败时逐个重试，只让出错的写操作失败
+            for job in batch:
+                self._execute([job])
+            return
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage='db_save', result='ok')
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+
+
+db_writer = DBWriter()
+
 
 class User(UserMixin, db.Model):
     """用户模型"""
@@ -74,9 +183,160 @@ class User(UserMixin, db.Model):
         return data
 
 
+class UserSnapshot(UserMixin):
+    """
+    与数据库会话分离的用户身份快照，只包含认证所需的列（也作为 Flask-Login 的 current_user）
+    其余配置（API Key、Cookie 等）首次访问时按 id 加载完整的 User 行；
+    需要修改用户时必须先调用 load() 获取 ORM 对象
+    """
+    FIELDS = ('id', 'username', 'is_admin', 'is_guest', 'extension_last_sync')
+    
+    def __init__(self, **values):
+        self.__dict__.update(values)
+    
+    @classmethod
+    def fetch(cls, *criteria):
+        """按条件只查询身份列，返回快照或 None"""
+        row = db.session.query(*[getattr(User, f) for f in cls.FIELDS]).filter(*criteria).first()
+        return cls(**row._asdict()) if row else None
+    
+    def load(self):
+        """加载完整的 User 行（同一请求内只查询一次，保存在 g 上）"""
+        from flask import g
+        rows = g.setdefault('_user_rows', {})
+        if self.id not in rows:
+            rows[self.id] = db.session.get(User, self.id)
+        return rows[self.id]
+    
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.load(), name)
+    
+    def __setattr__(self, name, value):
+        raise AttributeError(f'UserSnapshot 只读，修改 {name} 请使用 load() 返回的 User')
+
+
+class UserSnapshotCache:
+    """
+    进程内用户快照缓存（带 TTL）
+    修改相关字段时需调用 invalidate；多进程部署下其他进程最多在 TTL 后生效
+    """
+    MAX_ENTRIES = 4096
+    
+    def __init__(self, name: str, ttl: float = 60):
+        self.name = name  # 指标中的缓存名
+        self.ttl = ttl
+        self.entries = {}  # key -> (snapshot, 过期时间)
+        self.lock = threading.Lock()
+    
+    def get(self, key, loader):
+        """命中且未过期时直接返回，否则调用 loader() 加载；不存在的用户不缓存"""
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and entry[1] > now:
+                record_cache(self.name, True)
+                return entry[0]
+        record_cache(self.name, False)
+        snapshot = loader()
+        if snapshot is not None:
+            with self.lock:
+                if len(self.entries) >= self.MAX_ENTRIES:
+                    self.entries.clear()
+                self.entries[key] = (snapshot, now + self.ttl)
+        return snapshot
+    
+    def invalidate(self, key=None, user_id: int = None):
+        """按键或按用户 ID 失效"""
+        with self.lock:
+            if key is not None:
+                self.entries.pop(key, None)
+            if user_id is not None:
+                for k in [k for k, (snapshot, _) in self.entries.items() if snapshot.id == user_id]:
+                    del self.entries[k]
+
+
+# 插件令牌 -> 用户快照
+extension_token_cache = UserSnapshotCache('extension_token', ttl=60)
+# 用户 ID -> 用户快照（Flask-Login user_loader）
+user_cache = UserSnapshotCache('user', ttl=60)
+
+
+def invalidate_user_snapshots(user_id: int):
+    """用户身份列变化或用户被删除后，清除该用户的所有缓存快照"""
+    extension_token_cache.invalidate(user_id=user_id)
+    user_cache.invalidate(key=user_id)
+
+
+# 压缩数据首字节标记所用算法，读取时据此选择解压方式
+_CODEC_ZSTD = b'z'
+_CODEC_ZLIB = b'd'
+
+
+def compress_text(text):
+    """压缩文本（优先 zstd，未安装 zstandard 时使用 zlib）"""
+    if text is None:
+        return None
+    raw = text.encode('utf-8')
+    if zstandard is not None:
+        return _CODEC_ZSTD + zstandard.ZstdCompressor(level=6).compress(raw)
+    return _CODEC_ZLIB + zlib.compress(raw, 6)
+
+
+def decompress_text(data):
+    """解压 compress_text 生成的数据"""
+    if data is None:
+        return None
+    codec, payload = data[:1], data[1:]
+    if codec == _CODEC_ZSTD:
+        if zstandard is None:
+            raise RuntimeError('数据使用 zstd 压缩，请安装 zstandard')
+        return zstandard.ZstdDecompressor().decompress(payload).decode('utf-8')
+    return zlib.decompress(payload).decode('utf-8')
+
+
+class HistoryContent(db.Model):
+    """历史记录大字段（字幕和 AI 结果），压缩存储，按需加载"""
+    __tablename__ = 'history_contents'
+    
+    history_id = db.Column(db.Integer, db.ForeignKey('history_items.id', ondelete='CASCADE'), primary_key=True)
+    transcript = db.Column(db.LargeBinary, nullable=True)
+    ai_result = db.Column(db.LargeBinary, nullable=True)
+    ai_summary = db.Column(db.LargeBinary, nullable=True)
+    ai_chat = db.Column(db.LargeBinary, nullable=True)
+
+
+def _content_property(name: str, doc: str):
+    """把 HistoryContent 中的压缩字段映射为 HistoryItem 上的文本属性"""
+    def getter(self):
+        if self.content is None:
+            return None
+        return decompress_text(getattr(self.content, name))
+    
+    def setter(self, value):
+        if self.content is None:
+            self.content = HistoryContent()
+        setattr(self.content, name, compress_text(value))
+        if name == 'transcript':
+            self.has_transcript = bool(value)
+        # 内容在另一张表中，手动更新修改时间（前端据此检查更新）
+        self.updated_at = datetime.utcnow()
+    
+    return property(getter, setter, doc=doc)
+
+
 class HistoryItem(db.Model):
-    """历史记录模型"""
+    """历史记录模型（列表字段；字幕和 AI 结果存放在 HistoryContent 中）"""
     __tablename__ = 'history_items'
+    __table_args__ = (
+        # 历史列表按 (created_at, id) 倒序分页
+        db.Index('ix_history_items_user_created', 'user_id', 'created_at'),
+        # 插件按 BV 号查找历史记录；同一用户同一视频只保留一条（bvid 为空时存 NULL，不受唯一约束限制）
+        db.Index('uq_history_items_user_bvid', 'user_id', 'bvid', unique=True),
+        # save_history 和按 URL 删除
+        db.Index('ix_history_items_user_url', 'user_id', 'url'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), 
@@ -91,42 +351,250 @@ class HistoryItem(db.Model):
     duration = db.Column(db.Integer, nullable=True)
     pubdate = db.Column(db.Integer, nullable=True)
     tags = db.Column(db.Text, nullable=True)  # JSON 字符串
-    
-    # 处理结果
-    transcript = db.Column(db.Text, nullable=True)  # 字幕文本
-    ai_result = db.Column(db.Text, nullable=True)  # AI 处理结果（兼容旧版本）
-    ai_summary = db.Column(db.Text, nullable=True)  # AI 处理结果（基于提示词）
-    ai_chat = db.Column(db.Text, nullable=True)  # AI 对话历史
+    has_transcript = db.Column(db.Boolean, default=False, nullable=False)  # 是否已有字幕（用于筛选，避免加载全文）
     
     # 时间戳
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # 处理结果（按需加载）
+    content = db.relationship('HistoryContent', uselist=False, lazy='select',
+                              cascade='all, delete-orphan')
+    transcript = _content_property('transcript', '字幕文本')
+    ai_result = _content_property('ai_result', 'AI 处理结果（兼容旧版本）')
+    ai_summary = _content_property('ai_summary', 'AI 处理结果（基于提示词）')
+    ai_chat = _content_property('ai_chat', 'AI 对话历史')
+    
+    # 列表接口可返回的字段
+    SUMMARY_FIELDS = ('id', 'url', 'title', 'owner', 'cover', 'bvid', 'duration', 'pubdate', 'tags',
+                      'has_transcript', 'created_at', 'updated_at')
+    
+    def to_summary_dict(self, fields=None):
+        """转换为列表使用的轻量字典（不含字幕和 AI 结果），fields 指定只返回部分字段"""
+        import json
+        data = {}
+        for field in fields or self.SUMMARY_FIELDS:
+            value = getattr(self, field)
+            if field == 'tags':
+                value = json.loads(value) if value else []
+            elif field in ('created_at', 'updated_at'):
+                value = value.isoformat() if value else None
+            data[field] = value
+        return data
+    
     def to_dict(self):
         """转换为字典"""
+        data = self.to_summary_dict()
+        ai_result = self.ai_result
+        data.update({
+            'transcript': self.transcript,
+            'ai_result': ai_result,
+            'ai_summary': self.ai_summary or ai_result or '',  # 优先返回新字段，兼容旧数据
+            'ai_chat': self.ai_chat or ''
+        })
+        return data
+
+
+def history_bvid(url: str, bvid: str):
+    """
+    历史记录使用的 BV 号：多P视频的第 2P 起使用 "BVxxx_pN"，
+    与第 1P（插件按 BV 号查找的记录）区分开
+    """
+    import re
+    if not bvid:
+        return None  # 空 BV 号存为 NULL，不参与 (user_id, bvid) 唯一约束
+    match = re.search(r'[?&]p=(\d+)', url or '')
+    if match and int(match.group(1)) > 1 and '_p' not in bvid:
+        return f"{bvid}_p{match.group(1)}"
+    return bvid
+
+
+def commit_history_item(item, update):
+    """
+    提交新建的历史记录
+    并发请求已先插入同一 (user_id, bvid) 时唯一约束冲突：回滚后对已有记录调用 update(existing) 再提交
+    
+    Returns:
+        HistoryItem: 实际保存的记录
+    """
+    from sqlalchemy.exc import IntegrityError
+    
+    user_id, bvid = item.user_id, item.bvid
+    try:
+        db.session.commit()
+        return item
+    except IntegrityError:
+        db.session.rollback()
+        existing = HistoryItem.query.filter_by(user_id=user_id, bvid=bvid).first() if bvid else None
+        if existing is None:
+            raise
+        update(existing)
+        db.session.commit()
+        return existing
+
+
+class HistorySearchIndex:
+    """
+    历史记录全文搜索（SQLite FTS5 + trigram 分词，中文可按任意子串检索）
+    HistoryItem 写入时在同一事务中增量更新索引（见 _update_search_index）
+    """
+    
+    TABLE = 'history_fts'
+    # bm25 列权重：user_id 不参与，标题 > UP主 > 标签 > AI 总结 > 字幕
+    WEIGHTS = (0.0, 10.0, 5.0, 3.0, 2.0, 1.0)
+    MIN_TERM_LENGTH = 3  # trigram 可索引的最短词长，更短的词退化为 LIKE 扫描
+    SNIPPET_TOKENS = 32
+    # 片段高亮标记，转义 HTML 后再替换为 <mark>
+    MARK_OPEN, MARK_CLOSE = '\x02', '\x03'
+    
+    def __init__(self):
+        self.enabled = False
+    
+    def create(self, connection) -> bool:
+        """创建 FTS5 表，非 SQLite 或 SQLite 不支持 trigram 时返回 False"""
+        if connection.dialect.name != 'sqlite':
+            return False
+        try:
+            connection.execute(db.text(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.TABLE} USING fts5("
+                "user_id UNINDEXED, title, owner, tags, ai_summary, transcript, tokenize='trigram')"
+            ))
+        except Exception as e:
+            print(f'[WARNING] 全文搜索不可用（需要支持 FTS5 trigram 的 SQLite 3.34+）: {e}')
+            return False
+        return True
+    
+    def detect(self):
+        """检查索引表是否存在"""
+        from sqlalchemy import inspect
+        self.enabled = inspect(db.engine).has_table(self.TABLE)
+    
+    @staticmethod
+    def _document(item) -> dict:
         import json
+        tags = json.loads(item.tags) if item.tags else []
         return {
-            'id': self.id,
-            'url': self.url,
-            'title': self.title,
-            'owner': self.owner,
-            'cover': self.cover,
-            'bvid': self.bvid,
-            'duration': self.duration,
-            'pubdate': self.pubdate,
-            'tags': json.loads(self.tags) if self.tags else [],
-            'transcript': self.transcript,
-            'ai_result': self.ai_result,
-            'ai_summary': self.ai_summary or self.ai_result or '',  # 优先返回新字段，兼容旧数据
-            'ai_chat': self.ai_chat or '',
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+            'id': item.id,
+            'user_id': item.user_id,
+            'title': item.title or '',
+            'owner': item.owner or '',
+            'tags': ' '.join(tags),
+            'ai_summary': item.ai_summary or item.ai_result or '',
+            'transcript': item.transcript or ''
         }
+    
+    def index_items(self, connection, items):
+        """（重新）索引若干历史记录"""
+        items = [item for item in items if item.id is not None]
+        if not items:
+            return
+        self.remove(connection, [item.id for item in items])
+        connection.execute(db.text(
+            f"INSERT INTO {self.TABLE} (rowid, user_id, title, owner, tags, ai_summary, transcript) "
+            "VALUES (:id, :user_id, :title, :owner, :tags, :ai_summary, :transcript)"
+        ), [self._document(item) for item in items])
+    
+    def remove(self, connection, ids):
+        """从索引中删除历史记录（ids 可以是 id 列表或返回 id 的子查询）"""
+        from sqlalchemy import bindparam
+        if isinstance(ids, (list, tuple, set)):
+            if not ids:
+                return
+            connection.execute(
+                db.text(f"DELETE FROM {self.TABLE} WHERE rowid IN :ids").bindparams(bindparam('ids', expanding=True)),
+                {'ids': list(ids)}
+            )
+        else:
+            table = db.table(self.TABLE, db.column('rowid'))
+            connection.execute(db.delete(table).where(table.c.rowid.in_(ids)))
+    
+    def search(self, user_id: int, query: str, limit: int = 20, offset: int = 0) -> list:
+        """
+        搜索用户的历史记录，按相关度排序
+        
+        Returns:
+            list: [(history_id, snippet_html), ...]
+        """
+        import re
+        
+        terms = [t for t in re.split(r'\s+', query.strip()) if t]
+        if not terms:
+            return []
+        
+        params = {'user_id': user_id, 'limit': limit, 'offset': offset}
+        if all(len(t) >= self.MIN_TERM_LENGTH for t in terms):
+            # 每个词作为短语查询，多个词之间为 AND
+            params['match'] = ' '.join('"' + t.replace('"', '""') + '"' for t in terms)
+            weights = ', '.join(str(w) for w in self.WEIGHTS)
+            rows = db.session.execute(db.text(
+                f"SELECT rowid, snippet({self.TABLE}, -1, :mark_open, :mark_close, '…', {self.SNIPPET_TOKENS}) "
+                f"FROM {self.TABLE} WHERE {self.TABLE} MATCH :match AND user_id = :user_id "
+                f"ORDER BY bm25({self.TABLE}, {weights}) LIMIT :limit OFFSET :offset"
+            ), dict(params, mark_open=self.MARK_OPEN, mark_close=self.MARK_CLOSE)).all()
+            return [(row[0], self._render_snippet(row[1])) for row in rows]
+        
+        # 含有过短的词（如两个汉字），trigram 无法索引，改用 LIKE 扫描
+        conditions = []
+        for i, term in enumerate(terms):
+            params[f't{i}'] = '%' + term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+            conditions.append('(' + ' OR '.join(
+                f"{col} LIKE :t{i} ESCAPE '\\'" for col in ('title', 'owner', 'tags', 'ai_summary', 'transcript')
+            ) + ')')
+        rows = db.session.execute(db.text(
+            f"SELECT rowid, title, owner, tags, ai_summary, transcript FROM {self.TABLE} "
+            f"WHERE user_id = :user_id AND {' AND '.join(conditions)} "
+            "ORDER BY rowid DESC LIMIT :limit OFFSET :offset"
+        ), params).all()
+        return [(row[0], self._like_snippet(row[1:], terms)) for row in rows]
+    
+    def _render_snippet(self, text: str) -> str:
+        import html
+        return html.escape(text or '').replace(self.MARK_OPEN, '<mark>').replace(self.MARK_CLOSE, '</mark>')
+    
+    def _like_snippet(self, values, terms, radius: int = 40) -> str:
+        """为 LIKE 查询结果生成包含第一个命中词的片段"""
+        import re
+        pattern = re.compile('|'.join(re.escape(t) for t in terms), re.IGNORECASE)
+        for value in values:
+            match = pattern.search(value or '')
+            if not match:
+                continue
+            start, end = max(0, match.start() - radius), min(len(value), match.end() + radius)
+            text = value[start:end]
+            text = pattern.sub(lambda m: self.MARK_OPEN + m.group(0) + self.MARK_CLOSE, text)
+            return ('…' if start > 0 else '') + self._render_snippet(text) + ('…' if end < len(value) else '')
+        return ''
+
+
+history_search = HistorySearchIndex()
+
+
+@event.listens_for(Session, 'after_flush')
+def _update_search_index(session, flush_context):
+    """历史记录新增/修改/删除时在同一事务中更新全文索引（内容变更时 HistoryItem 也会被标记为已修改）"""
+    if not history_search.enabled:
+        return
+    changed = [obj for obj in list(session.new) + list(session.dirty) if isinstance(obj, HistoryItem)]
+    removed = [obj.id for obj in session.deleted if isinstance(obj, HistoryItem) and obj.id is not None]
+    if not changed and not removed:
+        return
+    connection = session.connection()
+    with session.no_autoflush:
+        if removed:
+            history_search.remove(connection, removed)
+        if changed:
+            history_search.index_items(connection, changed)
 
 
 class ExtensionTask(db.Model):
     """Chrome 插件任务模型 - 持久化任务状态"""
     __tablename__ = 'extension_tasks'
+    __table_args__ = (
+        # 查找用户某视频最新的未完成任务
+        db.Index('ix_extension_tasks_user_bvid_created', 'user_id', 'bvid', 'created_at'),
+        # 用户任务列表按创建时间倒序
+        db.Index('ix_extension_tasks_user_created', 'user_id', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     task_id = db.Column(db.String(40), unique=True, nullable=False, index=True)  # UUID
@@ -170,6 +638,117 @@ class ExtensionTask(db.Model):
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
 
+class TrackedCollection(db.Model):
+    """追踪的合集/列表/收藏夹 - 记录已见过的视频，刷新时只处理新增部分"""
+    __tablename__ = 'tracked_collections'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'collection_type', 'collection_id', name='uq_tracked_collection'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), 
+                        nullable=False, index=True)
+    url = db.Column(db.String(500), nullable=False)
+    collection_type = db.Column(db.String(20), nullable=False)  # season / series / favorite
+    collection_id = db.Column(db.String(50), nullable=False)
+    mid = db.Column(db.String(50), nullable=True)  # UP主 mid（合集/列表需要）
+    title = db.Column(db.String(500), nullable=True)
+    use_asr = db.Column(db.Boolean, default=True)
+    
+    # 同步状态
+    seen_bvids = db.Column(db.Text, nullable=True)  # 已见过的 BV 号（JSON 数组）
+    total = db.Column(db.Integer, default=0)
+    last_new_count = db.Column(db.Integer, default=0)
+    last_synced_at = db.Column(db.DateTime, nullable=True)
+    
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    user = db.relationship('User', backref=db.backref('tracked_collections', lazy='dynamic',
+                                                      cascade='all, delete-orphan'))
+    
+    def get_seen_bvids(self):
+        """获取已见过的 BV 号集合"""
+        import json
+        return set(json.loads(self.seen_bvids)) if self.seen_bvids else set()
+    
+    def set_seen_bvids(self, bvids):
+        """保存已见过的 BV 号集合"""
+        import json
+        self.seen_bvids = json.dumps(sorted(bvids))
+    
+    def to_target(self):
+        """转换为 parse_collection_url 的返回格式"""
+        return {'type': self.collection_type, 'mid': self.mid, 'id': self.collection_id}
+    
+    def to_dict(self):
+        """转换为字典"""
+        return {
+            'id': self.id,
+            'url': self.url,
+            'type': self.collection_type,
+            'collection_id': self.collection_id,
+            'title': self.title,
+            'use_asr': self.use_asr,
+            'seen_count': len(self.get_seen_bvids()),
+            'total': self.total,
+            'last_new_count': self.last_new_count,
+            'last_synced_at': self.last_synced_at.isoformat() if self.last_synced_at else None,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+
+class TaskTrace(db.Model):
+    """任务时间线（span 树，JSON 压缩存储），用于排查慢任务"""
+    __tablename__ = 'task_traces'
+    
+    MAX_ROWS = 5000  # 只保留最近的记录
+    PRUNE_EVERY = 100  # 每写入多少条清理一次
+    
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)  # batch / extension
+    task_key = db.Column(db.String(80), nullable=False, index=True)
+    user_id = db.Column(db.Integer, nullable=True, index=True)
+    bvid = db.Column(db.String(50), nullable=True, index=True)
+    title = db.Column(db.String(500), nullable=True)
+    status = db.Column(db.String(20), nullable=True)
+    duration_ms = db.Column(db.Integer, nullable=False, default=0, index=True)
+    span_count = db.Column(db.Integer, nullable=False, default=0)
+    data = db.Column(db.LargeBinary, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    
+    @classmethod
+    def store(cls, trace, status: str, duration_ms: int, payload: bytes):
+        """写入一条记录（由 db_writer 线程调用，无需 commit），定期清理旧记录"""
+        row = cls(kind=trace.kind, task_key=trace.key, user_id=trace.user_id, bvid=trace.bvid,
+                  title=(trace.title or '')[:500] or None, status=status, duration_ms=duration_ms,
+                  span_count=len(trace.spans), data=payload)
+        db.session.add(row)
+        db.session.flush()
+        if row.id % cls.PRUNE_EVERY == 0:
+            cls.query.filter(cls.id <= row.id - cls.MAX_ROWS).delete(synchronize_session=False)
+        return row.id
+    
+    def get_data(self):
+        """解压后的时间线"""
+        import json
+        return json.loads(decompress_text(self.data))
+    
+    def to_dict(self):
+        """列表用摘要（不含时间线）"""
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'task_key': self.task_key,
+            'user_id': self.user_id,
+            'bvid': self.bvid,
+            'title': self.title,
+            'status': self.status,
+            'duration_ms': self.duration_ms,
+            'span_count': self.span_count,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+
 class SystemConfig(db.Model):
     """系统配置模型（存储邀请码等）"""
     __tablename__ = 'system_config'
@@ -198,136 +777,299 @@ class SystemConfig(db.Model):
         return config
 
 
+class SchemaMigration(db.Model):
+    """已应用的数据库迁移版本"""
+    __tablename__ = 'schema_migrations'
+    
+    version = db.Column(db.Integer, primary_key=True)
+    description = db.Column(db.String(200), nullable=True)
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
 def init_database(app):
     """初始化数据库"""
     import secrets
+    from sqlalchemy.exc import IntegrityError
+    
+    db_writer.init_app(app)
     
     with app.app_context():
-        db.create_all()
-        
-        # 数据库迁移：检查并添加缺失的列
-        _migrate_extension_tasks_table()
-        _migrate_history_items_table()
-        _migrate_users_table()
-        
-        # 检查是否存在管理员账户
-        admin = User.query.filter_by(username='admin').first()
-        if not admin:
-            admin = User(username='admin', is_admin=True)
-            admin.set_password('admin')  # 默认密码
-            db.session.add(admin)
-            print('[INFO] 创建默认管理员账户: admin/admin')
-        
-        # 检查是否存在 guest 账户
-        guest = User.query.filter_by(username='guest').first()
-        if not guest:
-            guest = User(username='guest', is_admin=False, is_guest=True)
-            guest.set_password('guest')
-            db.session.add(guest)
-            print('[INFO] 创建默认 Guest 账户: guest/guest (配置和历史仅保存在会话中)')
-        elif not guest.is_guest:
-            # 如果已存在但未标记为 guest，则更新
-            guest.is_guest = True
-            print('[INFO] 更新 guest 账户标记')
+        configure_sqlite_engine(db.engine)
         
-        # 检查是否存在邀请码
-        invite_code = SystemConfig.get('invite_code')
-        if not invite_code:
-            # 生成 16 位随机邀请码
-            invite_code = secrets.token_urlsafe(12)[:16]
-            SystemConfig.set('invite_code', invite_code)
-            print(f'[INFO] 生成初始邀请码: {invite_code}')
-        
-        db.session.commit()
+        # 多进程同时启动时串行执行建表、迁移和初始数据写入
+        with _database_lock():
+            db.create_all()
+            
+            # 数据库迁移：按版本号执行尚未应用的迁移
+            run_migrations()
+            history_search.detect()
+            
+            # 检查是否存在管理员账户
+            admin = User.query.filter_by(username='admin').first()
+            if not admin:
+                admin = User(username='admin', is_admin=True)
+                admin.set_password('admin')  # 默认密码
+                db.session.add(admin)
+                print('[INFO] 创建默认管理员账户: admin/admin')
+            
+            # 检查是否存在 guest 账户
+            guest = User.query.filter_by(username='guest').first()
+            if not guest:
+                guest = User(username='guest', is_admin=False, is_guest=True)
+                guest.set_password('guest')
+                db.session.add(guest)
+                print('[INFO] 创建默认 Guest 账户: guest/guest (配置和历史仅保存在会话中)')
+            elif not guest.is_guest:
+                # 如果已存在但未标记为 guest，则更新
+                guest.is_guest = True
+                print('[INFO] 更新 guest 账户标记')
+            
+            # 检查是否存在邀请码
+            invite_code = SystemConfig.get('invite_code')
+            if not invite_code:
+                # 生成 16 位随机邀请码
+                invite_code = secrets.token_urlsafe(12)[:16]
+                SystemConfig.set('invite_code', invite_code)
+                print(f'[INFO] 生成初始邀请码: {invite_code}')
+            
+            try:
+                db.session.commit()
+            except IntegrityError:
+                # 其他进程已写入初始数据
+                db.session.rollback()
 
 
-def _migrate_extension_tasks_table():
-    """检查并添加 extension_tasks 表中缺失的列"""
-    try:
-        # 检查表是否存在
-        result = db.session.execute(db.text("SELECT name FROM sqlite_master WHERE type='table' AND name='extension_tasks'"))
-        if not result.fetchone():
-            return  # 表不存在，create_all 会创建
-        
-        # 获取现有列
-        result = db.session.execute(db.text("PRAGMA table_info(extension_tasks)"))
-        existing_columns = {row[1] for row in result.fetchall()}
-        
-        # 需要添加的列
-        migrations = [
-            ('cover', 'VARCHAR(500)'),
-            ('owner', 'VARCHAR(200)'),
-        ]
-        
-        for column_name, column_type in migrations:
-            if column_name not in existing_columns:
-                db.session.execute(db.text(f"ALTER TABLE extension_tasks ADD COLUMN {column_name} {column_type}"))
-                print(f'[INFO] 数据库迁移: 添加列 extension_tasks.{column_name}')
-        
-        db.session.commit()
-    except Exception as e:
-        print(f'[WARNING] 数据库迁移失败: {e}')
+class _database_lock:
+    """
+    初始化期间的跨进程互斥锁
+    PostgreSQL 使用会话级 advisory lock；SQLite 只有单机单文件，依赖其自身的写锁
+    """
+    
+    LOCK_KEY = 0x42494C49  # 'BILI'
+    
+    def __init__(self):
+        self.conn = None
+    
+    def __enter__(self):
+        if db.engine.dialect.name == 'postgresql':
+            self.conn = db.engine.connect()
+            self.conn.execute(db.text("SELECT pg_advisory_lock(:key)"), {'key': self.LOCK_KEY})
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        if self.conn is not None:
+            self.conn.execute(db.text("SELECT pg_advisory_unlock(:key)"), {'key': self.LOCK_KEY})
+            self.conn.close()
+            self.conn = None
+        return False
 
 
-def _migrate_history_items_table():
-    """检查并添加 history_items 表中缺失的列（AI 分区功能）"""
-    try:
-        # 检查表是否存在
-        result = db.session.execute(db.text("SELECT name FROM sqlite_master WHERE type='table' AND name='history_items'"))
-        if not result.fetchone():
-            return  # 表不存在，create_all 会创建
-        
-        # 获取现有列
-        result = db.session.execute(db.text("PRAGMA table_info(history_items)"))
-        existing_columns = {row[1] for row in result.fetchall()}
-        
-        # 需要添加的列
-        migrations = [
-            ('ai_summary', 'TEXT'),
-            ('ai_chat', 'TEXT'),
-        ]
-        
-        for column_name, column_type in migrations:
-            if column_name not in existing_columns:
-                db.session.execute(db.text(f"ALTER TABLE history_items ADD COLUMN {column_name} {column_type}"))
-                print(f'[INFO] 数据库迁移: 添加列 history_items.{column_name}')
-        
-        # 数据迁移：将现有 ai_result 复制到 ai_summary（如果 ai_summary 为空）
-        if 'ai_summary' not in existing_columns:
-            db.session.execute(db.text(
-                "UPDATE history_items SET ai_summary = ai_result WHERE ai_result IS NOT NULL AND ai_result != ''"
-            ))
-            print('[INFO] 数据库迁移: 已将现有 ai_result 复制到 ai_summary')
-        
-        db.session.commit()
-    except Exception as e:
-        print(f'[WARNING] history_items 数据库迁移失败: {e}')
+def _add_missing_columns(table: str, columns: list) -> set:
+    """
+    为表添加缺失的列（通过 SQLAlchemy inspect 获取现有列，与数据库方言无关）
+    
+    Returns:
+        set: 本次新增的列名
+    """
+    from sqlalchemy import inspect
+    
+    inspector = inspect(db.engine)
+    if not inspector.has_table(table):
+        return set()  # 表不存在，create_all 会创建
+    
+    existing_columns = {col['name'] for col in inspector.get_columns(table)}
+    added = set()
+    for column_name, column_type in columns:
+        if column_name not in existing_columns:
+            db.session.execute(db.text(f"ALTER TABLE {table} ADD COLUMN {column_name} {column_type}"))
+            print(f'[INFO] 数据库迁移: 添加列 {table}.{column_name}')
+            added.add(column_name)
+    return added
 
 
-def _migrate_users_table():
-    """检查并添加 users 表中缺失的列（云存储功能）"""
-    try:
-        # 检查表是否存在
-        result = db.session.execute(db.text("SELECT name FROM sqlite_master WHERE type='table' AND name='users'"))
-        if not result.fetchone():
-            return
-        
-        # 获取现有列
-        result = db.session.execute(db.text("PRAGMA table_info(users)"))
-        existing_columns = {row[1] for row in result.fetchall()}
-        
-        # 需要添加的列
-        migrations = [
-            ('webdav_url', 'VARCHAR(500)'),
-            ('webdav_username', 'VARCHAR(200)'),
-            ('webdav_password', 'VARCHAR(500)'),
-        ]
-        
-        for column_name, column_type in migrations:
-            if column_name not in existing_columns:
-                db.session.execute(db.text(f"ALTER TABLE users ADD COLUMN {column_name} {column_type}"))
-                print(f'[INFO] 数据库迁移: 添加列 users.{column_name}')
-        
-        db.session.commit()
-    except Exception as e:
-        print(f'[WARNING] users 数据库迁移失败: {e}')
+def _migration_extension_task_cover_owner():
+    _add_missing_columns('extension_tasks', [
+        ('cover', 'VARCHAR(500)'),
+        ('owner', 'VARCHAR(200)'),
+    ])
+
+
+def _migration_history_ai_sections():
+    from sqlalchemy import inspect
+    
+    inspector = inspect(db.engine)
+    if not inspector.has_table('history_items') or \
+            'transcript' not in {col['name'] for col in inspector.get_columns('history_items')}:
+        return  # 已是拆分后的结构（见迁移 4），AI 字段位于 history_contents
+    added = _add_missing_columns('history_items', [
+        ('ai_summary', 'TEXT'),
+        ('ai_chat', 'TEXT'),
+    ])
+    # 数据迁移：将现有 ai_result 复制到 ai_summary
+    if 'ai_summary' in added:
+        db.session.execute(db.text(
+            "UPDATE history_items SET ai_summary = ai_result WHERE ai_result IS NOT NULL AND ai_result != ''"
+        ))
+        print('[INFO] 数据库迁移: 已将现有 ai_result 复制到 ai_summary')
+
+
+def _migration_users_webdav():
+    _add_missing_columns('users', [
+        ('webdav_url', 'VARCHAR(500)'),
+        ('webdav_username', 'VARCHAR(200)'),
+        ('webdav_password', 'VARCHAR(500)'),
+    ])
+
+
+def _migration_history_contents():
+    """将 history_items 中的字幕和 AI 结果压缩后移到 history_contents"""
+    from sqlalchemy import inspect
+    
+    _add_missing_columns('history_items', [
+        ('has_transcript', 'BOOLEAN NOT NULL DEFAULT FALSE'),
+    ])
+    legacy_columns = ['transcript', 'ai_result', 'ai_summary', 'ai_chat']
+    existing_columns = {col['name'] for col in inspect(db.engine).get_columns('history_items')}
+    if 'transcript' not in existing_columns:
+        return  # 新建的数据库已是拆分后的结构
+    
+    columns = [c for c in legacy_columns if c in existing_columns]
+    rows = db.session.execute(db.text(
+        f"SELECT id, {', '.join(columns)} FROM history_items"
+    )).mappings().all()
+    for row in rows:
+        values = {c: compress_text(row[c]) for c in columns if row[c]}
+        if values:
+            db.session.add(HistoryContent(history_id=row['id'], **values))
+    db.session.execute(db.text(
+        "UPDATE history_items SET has_transcript = TRUE WHERE transcript IS NOT NULL AND transcript != ''"
+    ))
+    
+    for column in columns:
+        try:
+            db.session.execute(db.text(f"ALTER TABLE history_items DROP COLUMN {column}"))
+        except Exception:
+            # 旧版 SQLite 不支持 DROP COLUMN，清空旧列释放空间
+            db.session.execute(db.text(f"UPDATE history_items SET {column} = NULL"))
+    print(f'[INFO] 数据库迁移: 已迁移 {len(rows)} 条历史记录的字幕和 AI 结果到 history_contents')
+
+
+def _create_missing_indexes(model, names):
+    """创建模型上声明但数据库中尚不存在的索引"""
+    for index in model.__table__.indexes:
+        if index.name in names:
+            index.create(bind=db.session.connection(), checkfirst=True)
+
+
+def _migration_history_list_index():
+    _create_missing_indexes(HistoryItem, {'ix_history_items_user_created'})
+
+
+def _migration_hot_path_indexes():
+    """
+    插件热路径的组合索引和 (user_id, bvid) 唯一约束
+    旧版前端保存多P视频时各分P共用裸 BV 号，先按 URL 中的分P改写为 "BVxxx_pN"，
+    再合并同一分P的重复记录（保留有字幕且最近更新的一条，缺失的内容字段从被合并的记录补全）
+    """
+    from sqlalchemy import func, inspect
+    
+    has_search_index = inspect(db.engine).has_table(history_search.TABLE)
+    db.session.execute(db.text("UPDATE history_items SET bvid = NULL WHERE bvid = ''"))
+    
+    # 旧记录改写为分P键（只有带 p= 参数的 URL 可能需要改写）
+    rewritten = 0
+    rows = db.session.query(HistoryItem.id, HistoryItem.url, HistoryItem.bvid).filter(
+        HistoryItem.bvid.isnot(None), HistoryItem.url.contains('p=')
+    ).all()
+    for item_id, url, bvid in rows:
+        part_bvid = history_bvid(url, bvid)
+        if part_bvid != bvid:
+            db.session.execute(db.text("UPDATE history_items SET bvid = :bvid WHERE id = :id"),
+                               {'bvid': part_bvid, 'id': item_id})
+            rewritten += 1
+    if rewritten:
+        print(f'[INFO] 数据库迁移: {rewritten} 条多P历史记录改用分P键')
+    
+    duplicates = db.session.query(HistoryItem.user_id, HistoryItem.bvid).filter(
+        HistoryItem.bvid.isnot(None)
+    ).group_by(HistoryItem.user_id, HistoryItem.bvid).having(func.count(HistoryItem.id) > 1).all()
+    removed = 0
+    for user_id, bvid in duplicates:
+        # 同一 (user_id, bvid) 即同一视频的同一分P
+        items = HistoryItem.query.filter_by(user_id=user_id, bvid=bvid).order_by(
+            HistoryItem.has_transcript.desc(), HistoryItem.updated_at.desc(), HistoryItem.id.desc()
+        ).all()
+        keeper, merged = items[0], False
+        for item in items[1:]:
+            if item.content is not None:
+                for column in ('transcript', 'ai_result', 'ai_summary', 'ai_chat'):
+                    value = getattr(item.content, column)
+                    if value is None:
+                        continue
+                    if keeper.content is None:
+                        keeper.content = HistoryContent()
+                    if getattr(keeper.content, column) is None:
+                        setattr(keeper.content, column, value)
+                        merged = True
+                keeper.has_transcript = keeper.has_transcript or item.has_transcript
+            db.session.delete(item)
+            removed += 1
+            if has_search_index:
+                history_search.remove(db.session.connection(), [item.id])
+        if merged and has_search_index:
+            db.session.flush()
+            history_search.index_items(db.session.connection(), [keeper])
+    if removed:
+        db.session.flush()
+        print(f'[INFO] 数据库迁移: 合并重复的历史记录 {removed} 条')
+    
+    _create_missing_indexes(HistoryItem, {'uq_history_items_user_bvid', 'ix_history_items_user_url'})
+    _create_missing_indexes(ExtensionTask, {'ix_extension_tasks_user_bvid_created', 'ix_extension_tasks_user_created'})
+
+
+def _migration_history_search_index():
+    """创建全文搜索索引并索引已有历史记录"""
+    from sqlalchemy.orm import selectinload
+    
+    connection = db.session.connection()
+    if not history_search.create(connection):
+        return
+    last_id = 0
+    while True:
+        items = HistoryItem.query.filter(HistoryItem.id > last_id).order_by(HistoryItem.id)\
+            .options(selectinload(HistoryItem.content)).limit(500).all()
+        if not items:
+            break
+        history_search.index_items(connection, items)
+        last_id = items[-1].id
+        db.session.expunge_all()
+
+
+# 版本化迁移列表：只能在末尾追加，已发布的版本不要修改
+# 每个迁移需可在已包含该变更的数据库上重复执行（create_all 新建的表已是最新结构）
+MIGRATIONS = [
+    (1, 'extension_tasks 添加 cover/owner', _migration_extension_task_cover_owner),
+    (2, 'history_items 添加 AI 分区字段', _migration_history_ai_sections),
+    (3, 'users 添加 WebDAV 配置', _migration_users_webdav),
+    (4, '字幕和 AI 结果移到 history_contents 压缩存储', _migration_history_contents),
+    (5, 'history_items 添加 (user_id, created_at) 索引', _migration_history_list_index),
+    (6, '历史记录全文搜索索引', _migration_history_search_index),
+    (7, '插件热路径组合索引和 (user_id, bvid) 唯一约束', _migration_hot_path_indexes),
+]
+
+
+def run_migrations():
+    """按版本号依次执行尚未应用的迁移，每个版本在独立事务中提交"""
+    applied = {row.version for row in SchemaMigration.query.all()}
+    for version, description, migrate in MIGRATIONS:
+        if version in applied:
+            continue
+        try:
+            migrate()
+            db.session.add(SchemaMigration(version=version, description=description))
+            db.session.commit()
+            print(f'[INFO] 数据库迁移: 已应用版本 {version} ({description})')
+        except Exception as e:
+            db.session.rollback()
+            print(f'[WARNING] 数据库迁移 {version} 失败: {e}')
+            break
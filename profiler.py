@@ -0,0 +1,173 @@
+"""
+BiliSub 采样分析器
+在独立的系统线程中定时读取所有线程的调用栈（sys._current_frames），导出 speedscope 或折叠栈格式。
+eventlet 部署下处理线程都是绿色线程，运行中的绿色线程出现在 hub 所在系统线程的调用栈里，
+采样结果等同于按 CPU 占用统计；采样线程通过未打补丁的 _thread 创建，不受 hub 调度影响。
+"""
+import os
+import sys
+import threading
+import time
+
+try:
+    from eventlet import patcher as _eventlet_patcher
+except ImportError:
+    _eventlet_patcher = None
+
+
+def _original(module: str):
+    """eventlet 打过补丁时返回原始模块（eventlet 以 thread 标记 _thread 的补丁）"""
+    patched_name = 'thread' if module == '_thread' else module
+    if _eventlet_patcher is not None and _eventlet_patcher.is_monkey_patched(patched_name):
+        return _eventlet_patcher.original(module)
+    return __import__(module)
+
+
+class StackSampler:
+    """
+    定时采样所有线程的调用栈
+    同一时间只允许一个采样（已有采样时 acquire 返回 False）
+    """
+    # 栈顶为这些函数时视为空闲等待，默认不计入
+    IDLE_LEAVES = {
+        ('threading.py', 'wait'), ('threading.py', '_wait_for_tstate_lock'),
+        ('queue.py', 'get'), ('selectors.py', 'select'), ('socket.py', 'readinto'),
+        ('ssl.py', 'read'), ('ssl.py', 'recv_into'), ('epolls.py', 'wait'), ('poll.py', 'wait'),
+        ('kqueue.py', 'wait'), ('selects.py', 'wait'), ('hub.py', 'wait'),
+        ('profiler.py', 'run'),  # 发起采样的请求本身
+    }
+    MAX_DEPTH = 128
+
+    _lock = threading.Lock()
+    _busy = False
+
+    def __init__(self, interval: float = 0.01, include_idle: bool = False):
+        self.interval = interval
+        self.include_idle = include_idle
+        self.frames = []  # [(name, file, line)]
+        self.frame_index = {}
+        self.stacks = {}  # thread_name -> {(frame 下标, ...) 由根到叶: 样本数}
+        self.sample_count = 0
+        self.started = None
+        self.elapsed = 0.0
+        self.done = False
+        self.hub_ident = None  # eventlet 下运行所有绿色线程的系统线程
+
+    @classmethod
+    def acquire(cls) -> bool:
+        with cls._lock:
+            if cls._busy:
+                return False
+            cls._busy = True
+            return True
+
+    @classmethod
+    def release(cls):
+        with cls._lock:
+            cls._busy = False
+
+    def _frame_id(self, code) -> int:
+        key = (code.co_name, code.co_filename, code.co_firstlineno)
+        index = self.frame_index.get(key)
+        if index is None:
+            index = self.frame_index[key] = len(self.frames)
+            self.frames.append(key)
+        return index
+
+    def _thread_names(self) -> dict:
+        names = {t.ident: t.name for t in threading.enumerate()}
+        if self.hub_ident is not None:
+            names[self.hub_ident] = 'eventlet-hub'
+        return names
+
+    def _sample(self, own_ident: int, names: dict):
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident:
+                continue
+            leaf = frame.f_code
+            if not self.include_idle and (os.path.basename(leaf.co_filename), leaf.co_name) in self.IDLE_LEAVES:
+                continue
+            stack = []
+            while frame is not None and len(stack) < self.MAX_DEPTH:
+                stack.append(self._frame_id(frame.f_code))
+                frame = frame.f_back
+            stack.reverse()
+            thread_stacks = self.stacks.setdefault(names.get(ident) or f'thread-{ident}', {})
+            key = tuple(stack)
+            thread_stacks[key] = thread_stacks.get(key, 0) + 1
+        self.sample_count += 1
+
+    def _run(self, duration: float):
+        sleep = _original('time').sleep
+        own_ident = _original('_thread').get_ident()
+        names = self._thread_names()
+        self.started = time.perf_counter()
+        deadline = self.started + duration
+        next_names = self.started + 1
+        try:
+            while True:
+                now = time.perf_counter()
+                if now >= deadline:
+                    break
+                if now >= next_names:
+                    names = self._thread_names()
+                    next_names = now + 1
+                self._sample(own_ident, names)
+                sleep(max(0.0, self.interval - (time.perf_counter() - now)))
+        finally:
+            self.elapsed = time.perf_counter() - self.started
+            self.done = True
+
+    def run(self, duration: float):
+        """
+        采样 duration 秒后返回
+        采样在系统线程中进行，调用方以可让出的 time.sleep 轮询，eventlet 下不阻塞 hub
+        """
+        original_thread = _original('_thread')
+        if original_thread is not sys.modules.get('_thread'):
+            self.hub_ident = original_thread.get_ident()
+        original_thread.start_new_thread(self._run, (duration,))
+        while not self.done:
+            time.sleep(min(0.1, self.interval * 5))
+        return self
+
+    @property
+    def sample_weight(self) -> float:
+        """每个样本代表的秒数（按实际采样次数折算，抵消采样线程调度误差）"""
+        return self.elapsed / self.sample_count if self.sample_count else self.interval
+
+    def to_speedscope(self, name: str = 'BiliSub') -> dict:
+        """speedscope 文件格式（https://www.speedscope.app），每个线程一个 sampled profile"""
+        weight = self.sample_weight
+        profiles = []
+        for thread_name, stacks in sorted(self.stacks.items()):
+            items = sorted(stacks.items(), key=lambda item: -item[1])
+            profiles.append({
+                'type': 'sampled',
+                'name': thread_name,
+                'unit': 'seconds',
+                'startValue': 0,
+                'endValue': round(sum(count for _, count in items) * weight, 6),
+                'samples': [list(stack) for stack, _ in items],
+                'weights': [round(count * weight, 6) for _, count in items],
+            })
+        return {
+            '$schema': 'https://www.speedscope.app/file-format-schema.json',
+            'name': name,
+            'exporter': 'bilisub-profiler',
+            'activeProfileIndex': 0,
+            'shared': {'frames': [{'name': fn, 'file': path, 'line': line} for fn, path, line in self.frames]},
+            'profiles': profiles,
+        }
+
+    def to_collapsed(self) -> str:
+        """折叠栈格式（flamegraph.pl / speedscope 均可导入）：线程;根;...;叶 样本数"""
+        lines = []
+        for thread_name, stacks in sorted(self.stacks.items()):
+            for stack, count in sorted(stacks.items(), key=lambda item: -item[1]):
+                labels = [thread_name.replace(';', ':')]
+                for index in stack:
+                    fn, path, line = self.frames[index]
+                    labels.append(f'{fn} ({os.path.basename(path)}:{line})'.replace(';', ':'))
+                lines.append(f"{';'.join(labels)} {count}")
+        return '\n'.join(lines) + '\n'
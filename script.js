@@ -1000,7 +1000,7 @@ async function processWithLLM(type, identifier) {
             return;
         }
     } else if (type === 'history') {
-        const item = historyData.find(h => h.id === identifier);
+        const item = await ensureHistoryContent(historyData.find(h => h.id === identifier));
         if (item) {
             transcript = item.transcript;
             itemData = item;
@@ -1226,7 +1226,7 @@ function displayHistoryWithAiResult(id) {
  * 重新生成 AI 处理结果（基于提示词）
  */
 async function regenerateAiSummary(historyId) {
-    const item = historyData.find(h => h.id === historyId);
+    const item = await ensureHistoryContent(historyData.find(h => h.id === historyId));
     if (!item || !item.transcript) {
         showToast('没有字幕内容，无法生成摘要', 'error');
         return;
@@ -2550,31 +2550,23 @@ async function handleExtract() {
     `;
 
     try {
-        // 第1步：获取播放列表信息
-        const playlistRes = await fetch(`${API_BASE}/api/playlist_info`, {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ url: videoUrl })
+        // 第1步：获取播放列表信息（流式，边获取边渲染）
+        await fetchPlaylistStream(videoUrl, biliCookie, (videos) => {
+            videoList = videoList.concat(videos.map(v => ({
+                ...v,
+                status: '',
+                statusText: '等待处理'
+            }))).sort((a, b) => a.index - b.index);
+            renderVideoList();
         });
 
-        const playlistData = await playlistRes.json();
-
-        if (!playlistData.success) {
-            throw new Error(playlistData.error || '获取视频列表失败');
+        if (videoList.length === 0) {
+            throw new Error('未找到视频信息');
         }
 
-        videoList = playlistData.videos.map(v => ({
-            ...v,
-            status: '',
-            statusText: '等待处理'
-        }));
-
-        renderVideoList();
         showToast(`找到 ${videoList.length} 个视频`, 'success');
 
         // 第2步：批量处理
-        const biliCookie = biliCookieInput ? biliCookieInput.value.trim() : '';
-
         // 获取存储模式配置 (直接从DOM读取最新状态)
         const useSelfHostedToggle = document.getElementById('useSelfHostedStorage');
 
@@ -2639,6 +2631,69 @@ async function handleExtract() {
     }
 }
 
+/**
+ * 合集有分页获取失败时的错误（列表不完整，不能继续批量处理）
+ */
+function playlistPartialError(missingPages) {
+    return new Error(`合集第 ${missingPages.join(', ')} 页获取失败，视频列表不完整，请稍后重试`);
+}
+
+/**
+ * 流式获取播放列表，每收到一批视频调用一次 onVideos
+ * 流式接口不可用时回退到一次性接口；有分页获取失败时抛出错误
+ */
+async function fetchPlaylistStream(url, biliCookie, onVideos) {
+    const body = JSON.stringify({ url: url, bili_cookie: biliCookie });
+    const response = await fetch(`${API_BASE}/api/playlist_info_stream`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: body
+    });
+
+    if (!response.ok || !response.body) {
+        const playlistRes = await fetch(`${API_BASE}/api/playlist_info`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: body
+        });
+        const playlistData = await playlistRes.json();
+        if (!playlistData.success) {
+            throw new Error(playlistData.error || '获取视频列表失败');
+        }
+        onVideos(playlistData.videos);
+        if (playlistData.partial) {
+            throw playlistPartialError(playlistData.missing_pages || []);
+        }
+        return;
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        const events = buffer.split('\n\n');
+        buffer = events.pop();
+        for (const chunk of events) {
+            if (!chunk.startsWith('data: ')) continue;
+            const data = JSON.parse(chunk.slice(6));
+            if (data.type === 'videos') {
+                onVideos(data.videos);
+            } else if (data.type === 'meta') {
+                console.log('[Playlist]', data.title, '共', data.total, '个视频');
+            } else if (data.type === 'partial') {
+                throw playlistPartialError(data.missing_pages);
+            } else if (data.type === 'error') {
+                throw new Error(data.error || '获取视频列表失败');
+            }
+        }
+    }
+}
+
 /**
  * 处理批量处理的SSE消息
  */
@@ -2763,6 +2818,15 @@ async function initHistoryFeature() {
     await loadHistoryData();
     renderHistoryList();
 
+    // 滚动到底部时加载下一页
+    if (historyVideoList) {
+        historyVideoList.addEventListener('scroll', () => {
+            if (historyVideoList.scrollTop + historyVideoList.clientHeight >= historyVideoList.scrollHeight - 200) {
+                loadMoreHistory();
+            }
+        });
+    }
+
     // 绑定事件
     if (historySelectAll) {
         historySelectAll.addEventListener('change', handleHistorySelectAll);
@@ -2781,40 +2845,147 @@ async function initHistoryFeature() {
     }
 }
 
+// 历史列表分页状态
+const HISTORY_PAGE_SIZE = 50;
+let historyNextCursor = null;
+let historyTotal = 0;
+let historyLoadingMore = false;
+
+/**
+ * 转换服务器数据格式为前端格式
+ */
+function toHistoryEntry(item) {
+    return {
+        id: item.id.toString(),
+        title: item.title,
+        url: item.url,
+        owner: item.owner || '未知',
+        pic: item.cover || '',
+        pubdate: item.pubdate || 0,
+        pubdateFormatted: item.pubdate ? new Date(item.pubdate * 1000).toLocaleDateString() : '',
+        tags: item.tags || [],
+        // 列表接口不返回字幕和 AI 结果，使用前通过 ensureHistoryContent 加载
+        contentLoaded: item.transcript !== undefined,
+        hasTranscript: item.has_transcript !== undefined ? item.has_transcript : !!item.transcript,
+        transcript: item.transcript || '',
+        aiResult: item.ai_result || '',
+        aiSummary: item.ai_summary || '',  // AI 处理结果（提示词）
+        aiChat: item.ai_chat || '',  // AI 对话历史
+        date: item.created_at,
+        dateFormatted: item.created_at ? formatDate(new Date(item.created_at)) : '',
+        dateKey: item.created_at ? formatDateKey(new Date(item.created_at)) : ''
+    };
+}
+
 /**
- * 加载历史数据（从服务器）
+ * 获取一页历史记录
+ */
+async function fetchHistoryPage(cursor) {
+    const params = new URLSearchParams({ limit: HISTORY_PAGE_SIZE });
+    if (cursor) params.set('cursor', cursor);
+    const response = await fetch(`/api/history?${params}`);
+    return response.json();
+}
+
+/**
+ * 加载历史数据（从服务器，只加载第一页）
  */
 async function loadHistoryData() {
     try {
-        const response = await fetch('/api/history');
-        const data = await response.json();
+        const data = await fetchHistoryPage(null);
 
         if (data.success && data.history) {
-            // 转换服务器数据格式为前端格式
-            historyData = data.history.map(item => ({
-                id: item.id.toString(),
-                title: item.title,
-                url: item.url,
-                owner: item.owner || '未知',
-                pic: item.cover || '',
-                pubdate: item.pubdate || 0,
-                pubdateFormatted: item.pubdate ? new Date(item.pubdate * 1000).toLocaleDateString() : '',
-                tags: item.tags || [],
-                transcript: item.transcript || '',
-                aiResult: item.ai_result || '',
-                aiSummary: item.ai_summary || '',  // AI 处理结果（提示词）
-                aiChat: item.ai_chat || '',  // AI 对话历史
-                date: item.created_at,
-                dateFormatted: item.created_at ? formatDate(new Date(item.created_at)) : '',
-                dateKey: item.created_at ? formatDateKey(new Date(item.created_at)) : ''
-            }));
+            historyData = data.history.map(toHistoryEntry);
+            historyNextCursor = data.next_cursor || null;
+            historyTotal = data.total || historyData.length;
         } else {
             historyData = [];
+            historyNextCursor = null;
+            historyTotal = 0;
         }
     } catch (e) {
         console.error('加载历史数据失败:', e);
         historyData = [];
+        historyNextCursor = null;
+        historyTotal = 0;
+    }
+}
+
+// 服务端全文搜索结果：id -> 高亮片段（null 表示未在搜索）
+let historySearchHits = null;
+let historySearchQuery = '';
+
+/**
+ * 服务端全文搜索历史记录（包括尚未加载的分页和字幕内容）
+ */
+async function searchHistoryServer(query) {
+    historySearchQuery = query;
+    if (!query || isGuestUser) {
+        historySearchHits = null;
+        return;
+    }
+    try {
+        const response = await fetch(`/api/history/search?${new URLSearchParams({ q: query, limit: 100 })}`);
+        const data = await response.json();
+        if (historySearchQuery !== query) return;  // 已有更新的搜索
+        if (data.success) {
+            const existingIds = new Set(historyData.map(h => h.id));
+            historySearchHits = new Map();
+            data.results.forEach(result => {
+                const entry = toHistoryEntry(result);
+                historySearchHits.set(entry.id, result.snippet || '');
+                if (!existingIds.has(entry.id)) {
+                    historyData.push(entry);
+                }
+            });
+        }
+    } catch (e) {
+        console.warn('[History] 服务端搜索失败，使用本地筛选:', e);
+        historySearchHits = null;
+    }
+}
+
+/**
+ * 加载下一页历史记录（滚动到列表底部时调用）
+ */
+async function loadMoreHistory() {
+    if (!historyNextCursor || historyLoadingMore) return;
+    historyLoadingMore = true;
+    try {
+        const data = await fetchHistoryPage(historyNextCursor);
+        if (data.success && data.history) {
+            const existingIds = new Set(historyData.map(h => h.id));
+            historyData = historyData.concat(data.history.map(toHistoryEntry).filter(h => !existingIds.has(h.id)));
+            historyNextCursor = data.next_cursor || null;
+            historyTotal = data.total || historyTotal;
+            renderHistoryList();
+        }
+    } catch (e) {
+        console.error('加载更多历史记录失败:', e);
+    } finally {
+        historyLoadingMore = false;
+    }
+}
+
+/**
+ * 按需加载历史记录的字幕和 AI 结果
+ */
+async function ensureHistoryContent(item) {
+    if (!item || item.contentLoaded) return item;
+    try {
+        const response = await fetch(`/api/history/${item.id}`);
+        const data = await response.json();
+        if (data.success && data.item) {
+            item.transcript = data.item.transcript || '';
+            item.aiResult = data.item.ai_result || '';
+            item.aiSummary = data.item.ai_summary || '';
+            item.aiChat = data.item.ai_chat || '';
+            item.contentLoaded = true;
+        }
+    } catch (e) {
+        console.error('加载历史记录内容失败:', e);
     }
+    return item;
 }
 
 /**
@@ -2878,6 +3049,8 @@ async function addToHistory(video, transcript, metadata = {}) {
         pubdateFormatted: metadata.pubdate_formatted || '',
         tags: metadata.tags || [],
         transcript: transcript,
+        contentLoaded: true,
+        hasTranscript: !!transcript,
         date: now.toISOString(),
         dateFormatted: formatDate(now),
         dateKey: formatDateKey(now)  // 用于日期分组: "2025-12-10"
@@ -2889,6 +3062,7 @@ async function addToHistory(video, transcript, metadata = {}) {
         historyData[existingIndex] = historyItem;
     } else {
         historyData.unshift(historyItem);
+        historyTotal++;
     }
 
     // Guest 用户不保存到服务器（只在当前会话内存中保存）
@@ -2928,8 +3102,8 @@ function formatDate(date) {
 /**
  * 下载单个历史记录字幕
  */
-function downloadHistoryTranscript(id) {
-    const item = historyData.find(h => h.id === id);
+async function downloadHistoryTranscript(id) {
+    const item = await ensureHistoryContent(historyData.find(h => h.id === id));
     if (!item) return;
 
     const markdown = generateMarkdownContent(item);
@@ -2951,7 +3125,7 @@ function downloadHistoryTranscript(id) {
  * 复制单个历史记录字幕
  */
 async function copyHistoryTranscript(id) {
-    const item = historyData.find(h => h.id === id);
+    const item = await ensureHistoryContent(historyData.find(h => h.id === id));
     if (!item) return;
 
     try {
@@ -3017,7 +3191,8 @@ document.addEventListener('DOMContentLoaded', () => {
     if (searchInput) {
         searchInput.addEventListener('input', () => {
             clearTimeout(searchTimeout);
-            searchTimeout = setTimeout(() => {
+            searchTimeout = setTimeout(async () => {
+                await searchHistoryServer(searchInput.value.trim());
                 renderHistoryList();
             }, 300);
         });
@@ -3051,6 +3226,7 @@ function renderHistoryList() {
 
     if (searchText) {
         filteredData = filteredData.filter(item =>
+            (historySearchHits && historySearchHits.has(item.id)) ||
             (item.title && item.title.toLowerCase().includes(searchText)) ||
             (item.owner && item.owner.toLowerCase().includes(searchText)) ||
             (item.transcript && item.transcript.toLowerCase().includes(searchText))
@@ -3063,10 +3239,11 @@ function renderHistoryList() {
 
     if (historyCountSpan) {
         // 显示筛选后的数量 / 总数量
+        const total = Math.max(historyTotal, historyData.length);
         if (searchText || selectedUp) {
-            historyCountSpan.textContent = `${filteredData.length}/${historyData.length}`;
+            historyCountSpan.textContent = `${filteredData.length}/${total}`;
         } else {
-            historyCountSpan.textContent = historyData.length;
+            historyCountSpan.textContent = total;
         }
     }
 
@@ -3145,6 +3322,8 @@ function renderHistoryList() {
  */
 function renderHistoryItem(item) {
     const authorDisplay = item.owner ? `UP主: ${escapeHtml(item.owner)}` : '';
+    // 服务端搜索返回的片段已转义，仅包含 <mark> 高亮标签
+    const searchSnippet = historySearchHits ? (historySearchHits.get(item.id) || '') : '';
     // 封面图：如果有就显示，否则使用占位符
     const coverUrl = item.pic || 'data:image/svg+xml,%3Csvg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 160 100"%3E%3Crect fill="%23333" width="160" height="100"/%3E%3Ctext x="50%25" y="50%25" fill="%23666" text-anchor="middle" dy=".3em"%3E无封面%3C/text%3E%3C/svg%3E';
 
@@ -3160,6 +3339,7 @@ function renderHistoryItem(item) {
                 <div class="video-title-area">
                     <span class="video-title" title="${escapeHtml(item.title)}">${escapeHtml(item.title)}</span>
                 </div>
+                ${searchSnippet ? `<div class="history-search-snippet">${searchSnippet}</div>` : ''}
                 <div class="video-meta-area">
                     <span class="video-author">${authorDisplay}</span>
                     <div class="video-actions">
@@ -3231,6 +3411,7 @@ async function deleteHistoryItemByUrl(url) {
 
     const initialLength = historyData.length;
     historyData = historyData.filter(h => h.url !== url);
+    historyTotal = Math.max(0, historyTotal - (initialLength - historyData.length));
 
     if (historyData.length !== initialLength) {
         // 清理选中状态
@@ -3264,7 +3445,9 @@ async function deleteHistoryItem(id) {
     if (!item) return;
 
     // 直接删除，无需确认
+    const countBefore = historyData.length;
     historyData = historyData.filter(h => h.id !== id);
+    historyTotal = Math.max(0, historyTotal - (countBefore - historyData.length));
     selectedHistoryIds.delete(id);
     if (selectedHistoryId === id) {
         selectedHistoryId = null;
@@ -3333,6 +3516,7 @@ async function selectHistoryItem(id) {
 
     if (item && historyCurrentVideoTitle) {
         historyCurrentVideoTitle.textContent = item.title;
+        await ensureHistoryContent(item);
 
         // 从后端获取最新AI总结（支持插件端更新后刷新）
         try {
@@ -3399,6 +3583,7 @@ async function handleHistoryAiProcessSelected() {
 
     for (const item of selectedItems) {
         try {
+            await ensureHistoryContent(item);
             const response = await fetch('/api/llm_process', {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
@@ -3472,7 +3657,9 @@ function handleHistoryDeleteSelected() {
 
     // 直接删除，无需确认
 
+    const countBefore = historyData.length;
     historyData = historyData.filter(h => !selectedHistoryIds.has(h.id));
+    historyTotal = Math.max(0, historyTotal - (countBefore - historyData.length));
     selectedHistoryIds.clear();
     selectedHistoryId = null;
 
@@ -3517,6 +3704,8 @@ async function handleHistoryClearAll() {
     }
 
     historyData = [];
+    historyTotal = 0;
+    historyNextCursor = null;
     selectedHistoryIds.clear();
     selectedHistoryId = null;
 
@@ -3555,6 +3744,7 @@ async function downloadAsZip(items) {
     let downloadCount = 0;
     for (const item of items) {
         try {
+            await ensureHistoryContent(item);
             const mdContent = generateMarkdownContent(item);
             // 文件名格式：标题_UP主.md
             const safeTitle = item.title.replace(/[<>:"/\\|?*]/g, '_').substring(0, 80);
@@ -3957,28 +4147,189 @@ function startBatchPolling(batchId) {
     // 重新渲染视频列表以显示进度条
     renderVideoList();
 
+    // 订阅 WebSocket 进度推送（连接成功后会立即拉取一次状态）
+    subscribeBatchUpdates(batchId);
+
     // 立即执行一次
     pollBatchStatus();
 
-    // 启动轮询，每秒一次
+    // 轮询作为回退：WebSocket 正常推送时跳过，断开或长时间无推送时每秒一次
     if (pollInterval) clearInterval(pollInterval);
-    pollInterval = setInterval(pollBatchStatus, 1000);
+    pollInterval = setInterval(() => {
+        if (isBatchPushActive()) return;
+        pollBatchStatus();
+    }, 1000);
+}
+
+// ==================== 批量进度推送 ====================
+
+// 无插件 WebSocket 连接时（如 Guest）单独建立的连接
+let batchSocket = null;
+let lastBatchPushAt = 0;
+// 超过该时长没有收到推送时恢复轮询（毫秒）
+const BATCH_PUSH_STALE_MS = 10000;
+
+/**
+ * 获取用于接收批量进度的 Socket（优先复用插件任务的连接）
+ */
+function getBatchSocket() {
+    if (socket) return socket;
+    if (typeof io === 'undefined') return null;
+    if (!batchSocket) {
+        batchSocket = io({
+            transports: ['polling', 'websocket'],
+            reconnection: true,
+            reconnectionDelay: 1000,
+            reconnectionAttempts: 10
+        });
+        bindBatchSocketEvents(batchSocket);
+    }
+    return batchSocket;
+}
+
+/**
+ * 绑定批量进度事件（连接/重连后重新加入当前批次房间并补拉一次状态）
+ */
+function bindBatchSocketEvents(s) {
+    s.on('connect', () => {
+        if (currentBatchId) {
+            s.emit('join_batch_room', { batch_id: currentBatchId });
+            pollBatchStatus();
+        }
+    });
+    s.on('batch_update', handleBatchUpdate);
+}
+
+function subscribeBatchUpdates(batchId) {
+    lastBatchPushAt = 0;
+    const s = getBatchSocket();
+    if (s && s.connected) {
+        s.emit('join_batch_room', { batch_id: batchId });
+        lastBatchPushAt = Date.now();
+    }
+}
+
+function isBatchPushActive() {
+    const s = socket || batchSocket;
+    return !!(s && s.connected && Date.now() - lastBatchPushAt < BATCH_PUSH_STALE_MS);
+}
+
+/**
+ * 处理服务端推送的批量进度增量（只包含发生变化的视频）
+ */
+function handleBatchUpdate(update) {
+    if (!update || update.batch_id !== currentBatchId) return;
+    lastBatchPushAt = Date.now();
+
+    applyBatchProgress(update);
+
+    // 全部完成时拉取一次完整摘要，统一走结束处理（取消由 cancelBatch 自行处理）
+    if (update.status === 'completed') {
+        pollBatchStatus();
+    }
+}
+
+/**
+ * 更新整体进度和推送/轮询中包含的视频卡片
+ */
+function applyBatchProgress(data) {
+    const total = data.total || 1;
+    const completedCount = data.completed_count || 0;
+    const overallPercent = Math.round((completedCount / total) * 100);
+
+    const batchTitle = document.getElementById('batchTitle');
+    const batchTotalProgressBar = document.getElementById('batchTotalProgressBar');
+    const batchTotalPercent = document.getElementById('batchTotalPercent');
+
+    if (batchTitle) batchTitle.textContent = `正在处理 ${completedCount}/${total} 个视频`;
+    if (batchTotalProgressBar) batchTotalProgressBar.style.width = `${overallPercent}%`;
+    if (batchTotalPercent) batchTotalPercent.textContent = `${overallPercent}%`;
+
+    (data.videos || []).forEach(videoTask => {
+        try {
+            applyBatchVideoUpdate(data.batch_id || currentBatchId, videoTask);
+        } catch (e) {
+            console.error('[Batch] 处理视频状态出错:', e);
+        }
+    });
+}
+
+/**
+ * 应用单个视频的状态；完成时只获取一次字幕全文
+ */
+function applyBatchVideoUpdate(batchId, videoTask) {
+    // 使用后端保存的原始索引
+    const videoIndex = videoTask.original_index;
+    if (videoIndex === undefined || videoIndex === null) {
+        console.warn('[Batch] 视频任务缺少 original_index:', videoTask);
+        return;
+    }
+
+    updateVideoCardProgress(videoIndex, videoTask.status, videoTask.progress || 0);
+
+    if (processedVideoIndices.has(videoIndex)) return;
+
+    if (videoTask.status === 'completed') {
+        processedVideoIndices.add(videoIndex);
+
+        const originalVideo = videoList.find(v => v.index === videoIndex);
+        if (originalVideo) {
+            originalVideo.status = 'completed';
+            originalVideo.statusText = '已完成';
+        }
+
+        fetchBatchVideoTranscript(batchId, videoTask).then(transcript => {
+            if (!transcript) return;
+            // 保存结果到内存
+            videoTranscripts[videoIndex] = transcript;
+            if (originalVideo) {
+                // 保存到历史记录
+                addToHistory(originalVideo, transcript);
+                // 如果是第一个完成的，自动选中
+                if (!selectedVideoIndex && selectedVideoIndex !== 0) {
+                    selectVideo(videoIndex);
+                }
+            }
+        });
+    } else if (videoTask.status === 'error') {
+        processedVideoIndices.add(videoIndex);
+
+        const originalVideo = videoList.find(v => v.index === videoIndex);
+        if (originalVideo) {
+            originalVideo.status = 'error';
+            originalVideo.statusText = videoTask.error || '提取失败';
+        }
+    }
+}
+
+async function fetchBatchVideoTranscript(batchId, videoTask) {
+    // 兼容仍携带完整结果的响应
+    if (videoTask.result && videoTask.result.transcript) {
+        return videoTask.result.transcript;
+    }
+    try {
+        const response = await fetch(`${API_BASE}/api/batch_result/${batchId}/${videoTask.original_index}`);
+        const data = await response.json();
+        return data.success && data.result ? data.result.transcript : null;
+    } catch (error) {
+        console.error('[Batch] 获取字幕失败:', error);
+        return null;
+    }
 }
 
 /**
  * 轮询批量状态
  */
 async function pollBatchStatus() {
-    console.log('[Poll] pollBatchStatus 开始执行, batchId:', currentBatchId);
-    if (!currentBatchId) return;
+    const batchId = currentBatchId;
+    if (!batchId) return;
 
     try {
-        const response = await fetch(`${API_BASE}/api/batch_status/${currentBatchId}`);
-        console.log('[Poll] Fetch完成, status:', response.status, 'ok:', response.ok);
-
-        // 先获取文本，再尝试解析JSON
+        // results=0：不返回字幕全文，完成的视频通过 batch_result 单独获取一次
+        const response = await fetch(`${API_BASE}/api/batch_status/${batchId}?results=0`);
         const responseText = await response.text();
-        console.log('[Poll] 响应文本长度:', responseText.length, '前100字符:', responseText.substring(0, 100));
+        // 请求期间批次已结束（推送和轮询可能同时触发）
+        if (batchId !== currentBatchId) return;
 
         let responseData;
         try {
@@ -3988,8 +4339,6 @@ async function pollBatchStatus() {
             return;
         }
 
-        console.log('[Poll] API响应:', responseData);
-
         // API 返回格式: {success: true, data: {...}} 或 {success: false, error: "..."}
         if (!responseData.success) {
             console.error('[Poll] 轮询出错:', responseData.error);
@@ -4001,89 +4350,17 @@ async function pollBatchStatus() {
 
         // 获取实际的任务状态数据
         const data = responseData.data;
-        console.log('[Poll] data对象:', data ? '存在' : '不存在', 'videos数组:', data?.videos ? `${data.videos.length}个` : '不存在');
-
         if (!data) {
             console.error('[Poll] 轮询返回数据为空');
             return;
         }
+        if (!data.batch_id) data.batch_id = batchId;
 
-        // 更新整体进度条
-        const total = data.total || 1;
-        const completedCount = data.completed_count || 0;
-        const overallPercent = Math.round((completedCount / total) * 100);
+        // 更新整体进度条和每个视频卡片
+        applyBatchProgress(data);
 
-        const batchTitle = document.getElementById('batchTitle');
-        const batchTotalProgressBar = document.getElementById('batchTotalProgressBar');
-        const batchTotalPercent = document.getElementById('batchTotalPercent');
         const batchStatusBadge = document.getElementById('batchStatusBadge');
 
-        if (batchTitle) batchTitle.textContent = `正在处理 ${completedCount}/${total} 个视频`;
-        if (batchTotalProgressBar) batchTotalProgressBar.style.width = `${overallPercent}%`;
-        if (batchTotalPercent) batchTotalPercent.textContent = `${overallPercent}%`;
-
-        // 更新每个视频卡片的进度条
-        console.log('[Poll] 准备处理videos, 类型:', typeof data.videos, 'Array?:', Array.isArray(data.videos));
-
-        if (data.videos && data.videos.length > 0) {
-            try {
-                console.log('[Poll] 进入videos循环');
-                console.log('[Poll] 视频任务列表:', data.videos.map(v => ({ idx: v.original_index, status: v.status, progress: v.progress })));
-
-                data.videos.forEach((videoTask, forEachIdx) => {
-                    console.log(`[Poll] forEach第${forEachIdx}次, videoTask:`, videoTask);
-
-                    // 使用后端保存的原始索引，而不是 forEach 的循环索引
-                    const videoIndex = videoTask.original_index;
-                    if (videoIndex === undefined || videoIndex === null) {
-                        console.warn('[Poll] 视频任务缺少 original_index:', videoTask);
-                        return;
-                    }
-
-                    console.log(`[Poll] 更新视频${videoIndex}: status=${videoTask.status}, progress=${videoTask.progress}`);
-
-                    // 更新进度条
-                    updateVideoCardProgress(videoIndex, videoTask.status, videoTask.progress || 0);
-
-                    // 检查完成状态
-                    if (videoTask.status === 'completed' && !processedVideoIndices.has(videoIndex)) {
-                        // 保存结果到内存
-                        if (videoTask.result && videoTask.result.transcript) {
-                            videoTranscripts[videoIndex] = videoTask.result.transcript;
-                        }
-                        processedVideoIndices.add(videoIndex);
-
-                        // 更新原始列表状态
-                        const originalVideo = videoList.find(v => v.index === videoIndex);
-                        if (originalVideo) {
-                            originalVideo.status = 'completed';
-                            originalVideo.statusText = '已完成';
-
-                            // 保存到历史记录
-                            if (videoTask.result && videoTask.result.transcript) {
-                                addToHistory(originalVideo, videoTask.result.transcript);
-                            }
-
-                            // 如果是第一个完成的，自动选中
-                            if (!selectedVideoIndex && selectedVideoIndex !== 0) {
-                                selectVideo(videoIndex);
-                            }
-                        }
-                    } else if (videoTask.status === 'error' && !processedVideoIndices.has(videoIndex)) {
-                        processedVideoIndices.add(videoIndex);
-
-                        const originalVideo = videoList.find(v => v.index === videoIndex);
-                        if (originalVideo) {
-                            originalVideo.status = 'error';
-                            originalVideo.statusText = videoTask.error || '提取失败';
-                        }
-                    }
-                });
-            } catch (videosLoopError) {
-                console.error('[Poll] 处理videos循环出错:', videosLoopError);
-            }
-        }
-
         // 判断是否全部完成（包括有cancelled的情况）
         if (data.status === 'completed' || data.status === 'cancelled') {
             stopBatchPolling();
@@ -4133,6 +4410,10 @@ function stopBatchPolling() {
         clearInterval(pollInterval);
         pollInterval = null;
     }
+    const s = socket || batchSocket;
+    if (s && s.connected && currentBatchId) {
+        s.emit('leave_batch_room', { batch_id: currentBatchId });
+    }
     currentBatchId = null;
 }
 
@@ -4370,6 +4651,8 @@ async function fetchExtensionTasks() {
                 renderHistoryList();
             }
 
+            // 作为 WebSocket 增量更新的基线
+            _extensionTasksCache = data.tasks;
             renderExtensionTasks(data.tasks);
         }
     } catch (error) {
@@ -4604,11 +4887,15 @@ function initWebSocket(userId) {
     });
 
     // 监听单个任务更新
+    // 服务端只推送变化的字段（首次为完整快照），由 handleTaskUpdate 合并到缓存
     socket.on('task_update', (taskData) => {
         console.log('[WebSocket] 收到任务更新:', taskData.task_id, taskData.status);
         handleTaskUpdate(taskData);
     });
 
+    // 批量进度推送（复用同一连接）
+    bindBatchSocketEvents(socket);
+
     // 监听任务列表更新
     socket.on('tasks_list', (data) => {
         console.log('[WebSocket] 收到任务列表:', data.tasks?.length);
@@ -4620,6 +4907,16 @@ function initWebSocket(userId) {
 
 // 存储当前任务列表（用于增量更新）
 let _extensionTasksCache = [];
+let _extensionTasksRefreshTimer = null;
+
+// 合并短时间内的多次刷新请求
+function scheduleExtensionTasksRefresh() {
+    if (_extensionTasksRefreshTimer) return;
+    _extensionTasksRefreshTimer = setTimeout(() => {
+        _extensionTasksRefreshTimer = null;
+        fetchExtensionTasks();
+    }, 500);
+}
 
 function handleTaskUpdate(taskData) {
     // 如果任务完成，刷新历史列表
@@ -4633,8 +4930,12 @@ function handleTaskUpdate(taskData) {
     const existingIndex = _extensionTasksCache.findIndex(t => t.task_id === taskData.task_id);
     if (existingIndex >= 0) {
         _extensionTasksCache[existingIndex] = { ..._extensionTasksCache[existingIndex], ...taskData };
-    } else {
+    } else if (taskData.full) {
         _extensionTasksCache.unshift(taskData);
+    } else {
+        // 没有基线的增量更新无法组成完整任务卡片，重新拉取任务列表
+        scheduleExtensionTasksRefresh();
+        return;
     }
 
     // 重新渲染
@@ -0,0 +1,231 @@
+"""
+BiliSub 任务时间线
+每个批量视频和插件任务记录一棵 span 树（B站接口调用、yt-dlp、下载、上传、语音识别、数据库写入），
+任务结束后压缩存入 task_traces 表，在管理后台以瀑布图展示。
+处理线程通过 activate() 绑定当前任务，未绑定时 span() 不做任何记录。
+"""
+import functools
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+
+class Span:
+    __slots__ = ('id', 'name', 'parent', 'start', 'end', 'attrs')
+
+    def __init__(self, span_id, name, parent, start, attrs):
+        self.id = span_id
+        self.name = name
+        self.parent = parent
+        self.start = start
+        self.end = None
+        self.attrs = attrs
+
+    def set(self, **attrs):
+        """补充属性（span 结束后仍可设置，序列化时读取）"""
+        self.attrs.update(attrs)
+
+    @property
+    def duration(self) -> float:
+        return (self.end if self.end is not None else time.time()) - self.start
+
+
+class _NullSpan:
+    """未绑定任务时返回的空 span"""
+    id = None
+
+    def set(self, **attrs):
+        pass
+
+    duration = 0.0
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Trace:
+    """
+    单个任务的 span 树
+    时间均为 Unix 时间戳，序列化时转为相对任务开始的毫秒数
+    """
+    MAX_SPANS = 400  # 超出后只计数不记录，避免异常任务撑大记录
+
+    def __init__(self, kind: str, key: str, user_id: int = None, bvid: str = None,
+                 title: str = None, queued_at: float = None):
+        self.kind = kind
+        self.key = key
+        self.user_id = user_id
+        self.bvid = bvid
+        self.title = title
+        self.started = time.time()
+        self._perf0 = time.perf_counter()
+        self.origin = min(queued_at, self.started) if queued_at else self.started
+        self.finished = None
+        self.spans = []
+        self.dropped = 0
+        self.lock = threading.Lock()
+        self.stacks = threading.local()  # 每个线程各自的打开 span 栈
+        if queued_at and queued_at < self.started:
+            self.add('queue', queued_at, self.started)
+
+    def now(self) -> float:
+        """单调时钟换算的时间戳，不受系统时间调整影响"""
+        return self.started + (time.perf_counter() - self._perf0)
+
+    def _stack(self) -> list:
+        stack = getattr(self.stacks, 'items', None)
+        if stack is None:
+            stack = self.stacks.items = []
+        return stack
+
+    def current_span_id(self):
+        stack = self._stack()
+        return stack[-1] if stack else None
+
+    def _new_span(self, name, parent, start, attrs):
+        with self.lock:
+            if len(self.spans) >= self.MAX_SPANS:
+                self.dropped += 1
+                return None
+            span = Span(len(self.spans), name, parent, start, attrs)
+            self.spans.append(span)
+            return span
+
+    @contextmanager
+    def span(self, name: str, parent=None, **attrs):
+        """记录一个 span，parent 默认为当前线程最内层的 span"""
+        if parent is None:
+            parent = self.current_span_id()
+        span = self._new_span(name, parent, self.now(), attrs)
+        if span is None:
+            yield NULL_SPAN
+            return
+        stack = self._stack()
+        stack.append(span.id)
+        try:
+            yield span
+        except BaseException as e:
+            span.attrs['error'] = str(e)[:200]
+            raise
+        finally:
+            stack.pop()
+            span.end = self.now()
+
+    def add(self, name: str, start: float, end: float, parent=None, **attrs):
+        """记录一个已经结束的区间（如语音识别的排队、运行时间），返回 span id"""
+        if parent is None:
+            parent = self.current_span_id()
+        span = self._new_span(name, parent, start, attrs)
+        if span is None:
+            return None
+        span.end = end
+        return span.id
+
+    def finish(self):
+        self.finished = self.now()
+
+    @property
+    def duration_ms(self) -> int:
+        return int(((self.finished or self.now()) - self.origin) * 1000)
+
+    def to_dict(self) -> dict:
+        """
+        紧凑格式：spans 为 [name, parent, start_ms, duration_ms, attrs?]，
+        parent 为父 span 在列表中的下标（根为 -1），start_ms 相对 origin
+        """
+        end_default = self.finished or self.now()
+        rows = []
+        with self.lock:
+            spans = list(self.spans)
+        for span in spans:
+            end = span.end if span.end is not None else end_default
+            row = [span.name, -1 if span.parent is None else span.parent,
+                   round((span.start - self.origin) * 1000, 1), round((end - span.start) * 1000, 1)]
+            if span.attrs:
+                row.append(span.attrs)
+            rows.append(row)
+        return {
+            'v': 1,
+            'kind': self.kind,
+            'key': self.key,
+            'bvid': self.bvid,
+            'title': self.title,
+            'start': self.origin,
+            'duration_ms': self.duration_ms,
+            'dropped': self.dropped,
+            'spans': rows,
+        }
+
+
+def current():
+    """当前线程绑定的任务时间线"""
+    return getattr(_local, 'trace', None)
+
+
+@contextmanager
+def activate(trace: Trace):
+    """在当前线程绑定任务时间线"""
+    previous = current()
+    _local.trace = trace
+    try:
+        yield trace
+    finally:
+        _local.trace = previous
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """在当前任务时间线上记录 span，未绑定任务时为空操作"""
+    trace = current()
+    if trace is None:
+        yield NULL_SPAN
+        return
+    with trace.span(name, **attrs) as s:
+        yield s
+
+
+def record(name: str, start: float, end: float, parent=None, **attrs):
+    """记录已结束的区间，未绑定任务时返回 None"""
+    trace = current()
+    if trace is None:
+        return None
+    return trace.add(name, start, end, parent=parent, **attrs)
+
+
+def now() -> float:
+    trace = current()
+    return trace.now() if trace is not None else time.time()
+
+
+def traced(name: str):
+    """装饰器：将函数调用记录为 span"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def save(trace: Trace, status: str):
+    """任务结束后经 db_writer 异步写入 task_traces，失败只记日志"""
+    from models import TaskTrace, compress_text, db_writer
+
+    trace.finish()
+    data = trace.to_dict()
+    payload = compress_text(json.dumps(data, ensure_ascii=False, separators=(',', ':')))
+
+    def write():
+        TaskTrace.store(trace, status, data['duration_ms'], payload)
+
+    try:
+        db_writer.submit(write)
+    except Exception as e:
+        logger.warning(f"[Trace] 保存任务时间线失败: {trace.key}, {e}")
@@ -0,0 +1,89 @@
+"""
+BiliSub 任务 worker（bilisub-worker）
+从消息总线的任务队列领取插件字幕任务，在独立进程中执行
+字幕获取、音频下载、上传、语音识别和保存，进度经消息总线回传给 Web 进程。
+Web 进程需设置 EXTERNAL_TASK_WORKERS=1，两边使用相同的 MESSAGE_BUS_URL 和数据库。
+各阶段耗时和识别计费时长记录在 worker 进程内，不会出现在 Web 进程的 /metrics 中，
+需用 --metrics-port 导出（多进程时第 i 个进程监听 端口+i），设置 METRICS_TOKEN 后同样需要令牌。
+
+用法:
+    MESSAGE_BUS_URL=redis://redis:6379/0 python worker.py [--processes 2] [--threads 4] [--metrics-port 9101]
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import threading
+
+logger = logging.getLogger('bilisub.worker')
+
+
+def run_worker(threads: int, metrics_port: int = 0):
+    """
+    单个 worker 进程：最多同时处理 threads 个任务，有空闲线程时才领取，其余任务留给其他进程
+    metrics_port 非 0 时在该端口导出本进程的 /metrics
+    """
+    os.environ['BILISUB_ROLE'] = 'worker'
+    import app
+    from concurrent.futures import ThreadPoolExecutor
+
+    if not app.MESSAGE_BUS_URL or app.MESSAGE_BUS_URL.startswith('memory://'):
+        raise SystemExit('worker 需要设置 MESSAGE_BUS_URL（如 redis://redis:6379/0）与 Web 进程通信')
+
+    if metrics_port:
+        import metrics
+        metrics.start_http_server(metrics_port, token=app.METRICS_TOKEN)
+        logger.info(f"[worker] 进程 {os.getpid()} 在端口 {metrics_port} 导出 /metrics")
+
+    slots = threading.Semaphore(threads)
+    pool = ThreadPoolExecutor(max_workers=threads)
+    logger.info(f"[worker] 进程 {os.getpid()} 已启动，并发 {threads}")
+
+    def run(job):
+        try:
+            app._extension_process_task(job['task_id'], job['user_id'], job['bvid'],
+                                        job.get('use_asr', False), job.get('origin_url'))
+        finally:
+            slots.release()
+
+    while True:
+        slots.acquire()
+        try:
+            job = app.message_bus.pop(app.EXTENSION_TASK_QUEUE, timeout=5)
+        except Exception as e:
+            logger.warning(f"[worker] 领取任务失败: {e}")
+            job = None
+        if job is None:
+            slots.release()
+            continue
+        logger.info(f"[worker] 领取任务: task_id={job['task_id']}, bvid={job['bvid']}")
+        pool.submit(run, job)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='BiliSub 任务 worker')
+    parser.add_argument('--processes', type=int, default=int(os.environ.get('WORKER_PROCESSES', 1)),
+                        help='worker 进程数')
+    parser.add_argument('--threads', type=int, default=int(os.environ.get('WORKER_THREADS', 4)),
+                        help='每个进程的并发任务数')
+    parser.add_argument('--metrics-port', type=int, default=int(os.environ.get('WORKER_METRICS_PORT', 0)),
+                        help='导出 /metrics 的端口，多进程时依次加 1（0 为不导出）')
+    args = parser.parse_args()
+
+    if args.processes <= 1:
+        run_worker(args.threads, args.metrics_port)
+        return
+
+    # spawn 启动，避免 fork 继承父进程的线程和数据库连接
+    ctx = multiprocessing.get_context('spawn')
+    processes = [ctx.Process(target=run_worker, args=(args.threads, args.metrics_port + i if args.metrics_port else 0),
+                             daemon=True)
+                 for i in range(args.processes)]
+    for p in processes:
+        p.start()
+    for p in processes:
+        p.join()
+
+
+if __name__ == '__main__':
+    main()